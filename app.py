@@ -2,20 +2,26 @@ import os
 
 from flask import Flask, jsonify, request
 from flask_smorest import Api
-from flask_migrate import Migrate
-from flask_caching import Cache
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt
 
 from db import db
 from cache import cache
+import conditional
+import postgres
+from ratelimit import limiter
+from serving import ServingApi, preload, register_static_spec
 
 from blueprints.user import blp as UserBlueprint
 from blueprints.admin import blp as AdminBlueprint
 from blueprints.index import blp as IndexBlueprint
 from blueprints.db import blp as DBBlueprint
 from blueprints.movies import blp as MovieBlueprint
+from blueprints.directors import blp as DirectorBlueprint
+from blueprints.stats import blp as StatsBlueprint
+from commands import catalog_cli, outbox_cli
 
 import models
+import events
 
 
 def create_app(db_url=None):
@@ -31,6 +37,9 @@ def create_app(db_url=None):
     app.config["SQLALCHEMY_DATABASE_URI"] = (
         os.getenv("DB_URL", "sqlite:///movies.db") or db_url or "sqlite:///movies.db"
     )
+    # "serve" skips migrations and OpenAPI generation in gunicorn workers
+    app.config["APP_MODE"] = os.getenv("APP_MODE", "full")
+    app.config["OPENAPI_SPEC_FILE"] = os.getenv("OPENAPI_SPEC_FILE", "openapi.json")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["PROPAGATE_EXCEPTIONS"] = True
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "secret")
@@ -47,7 +56,37 @@ def create_app(db_url=None):
         os.getenv("REDIS_PASSWORD") or None
     )  # Optional Redis password
 
+    # Seconds before the typeahead index is rebuilt to pick up other workers' writes
+    app.config["SUGGEST_MAX_AGE"] = float(os.getenv("SUGGEST_MAX_AGE", 300))
+    # "memory" answers numeric searches from the in-memory read model, "sql" queries the DB
+    app.config["SEARCH_READ_MODEL"] = os.getenv("SEARCH_MODE", "sql") == "memory"
+    app.config["READ_MODEL_MAX_AGE"] = float(os.getenv("READ_MODEL_MAX_AGE", 300))
+    # Directory the read model columns are mapped from when preloaded (empty: heap)
+    app.config["READ_MODEL_DIR"] = os.getenv("READ_MODEL_DIR", "")
+    # Catalog snapshot the read model starts from (`flask catalog write-snapshot`)
+    app.config["CATALOG_SNAPSHOT"] = os.getenv("CATALOG_SNAPSHOT", "")
+    # Build the in-memory catalog structures in create_app, before workers fork
+    app.config["PRELOAD"] = os.getenv("PRELOAD", "0") == "1"
+
+    # Smallest JSON body, in bytes, that gets compressed
+    app.config["COMPRESS_MIN_SIZE"] = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    # "worker" leaves cache invalidation to `flask outbox run`, "inline" applies it after commit
+    app.config["OUTBOX_MODE"] = os.getenv("OUTBOX_MODE", "inline")
+    # Seconds a response is replayed for retries with the same Idempotency-Key
+    app.config["IDEMPOTENCY_TTL"] = int(os.getenv("IDEMPOTENCY_TTL", 86400))
+
+    # "redis" shares rate limit buckets between workers, "memory" keeps them per process
+    app.config["RATELIMIT_STORAGE"] = os.getenv("RATELIMIT_STORAGE", "memory")
+    app.config["RATELIMIT_ENABLED"] = os.getenv("RATELIMIT_ENABLED", "1") == "1"
+    # Requests served at once per process (0 disables) and seconds a request may wait
+    app.config["MAX_CONCURRENT_REQUESTS"] = int(
+        os.getenv("MAX_CONCURRENT_REQUESTS", 0)
+    )
+    app.config["MAX_QUEUE_WAIT"] = float(os.getenv("MAX_QUEUE_WAIT", 0.5))
+
     cache.init_app(app)
+    conditional.init_app(app)
+    limiter.init_app(app)
     protected_routes = ["/movies"]
     # JWT
     jwt = JWTManager(app)
@@ -60,10 +99,13 @@ def create_app(db_url=None):
                 and request.method
                 in [
                     "POST",
+                    "PUT",
                     "PATCH",
                     "DELETE",
                 ]
                 and not request.path.endswith("favourite")
+                # Reads with the ids in the body
+                and request.path != "/movies/mget"
             ):
 
                 @jwt_required()
@@ -110,15 +152,33 @@ def create_app(db_url=None):
         )
 
     db.init_app(app)
+    postgres.init_app(app)
+
+    if app.config["APP_MODE"] == "serve":
+        spec_url = app.config["OPENAPI_URL_PREFIX"] + "openapi.json"
+        app.config["OPENAPI_URL_PREFIX"] = None
+        api = ServingApi(app)
+        register_static_spec(app, spec_url, app.config["OPENAPI_SPEC_FILE"])
+    else:
+        # Alembic is slow to import and only needed by `flask db`
+        from flask_migrate import Migrate
 
-    migrate = Migrate(app, db)
-    api = Api(app)
+        migrate = Migrate(app, db)
+        api = Api(app)
 
     api.register_blueprint(IndexBlueprint)
     api.register_blueprint(DBBlueprint)
     api.register_blueprint(UserBlueprint)
     api.register_blueprint(AdminBlueprint)
     api.register_blueprint(MovieBlueprint)
+    api.register_blueprint(DirectorBlueprint)
+    api.register_blueprint(StatsBlueprint)
+
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(outbox_cli)
+
+    if app.config["PRELOAD"]:
+        preload(app)
 
     return app
 
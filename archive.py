@@ -0,0 +1,154 @@
+"""Soft deletes and the archive tier of the catalog.
+
+Deleting a movie only sets its `deleted_at`. Reads filter on
+`deleted_at IS NULL` and the hot indexes of the movie table are partial on
+that same predicate, so deleted rows stay out of lists, searches and lookups
+without slowing them down.
+
+`archive` later moves movies out of the movie table, in batches, into
+movie_archive: deleted ones, and optionally live ones that went cold (not
+updated for a while, below a popularity). Archived movies keep their id and
+are still served by id; deleted ones answer 410 Gone. Archiving a live movie
+is an "archive" change: it leaves lists and searches like a delete, but the
+change feed tells mirrors it still exists.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from db import db, favorites_association, movie_genre_association
+from events import ARCHIVE, MovieChange, record_change
+from models import GenreModel, MovieArchiveModel, MovieModel
+
+
+def find(id: int):
+    """Archived or deleted movie with the given id, or None.
+
+    Returns:
+        MovieArchiveModel | MovieModel: Movie, check `deleted_at` before serving
+    """
+    movie = db.session.get(MovieArchiveModel, id)
+    if movie is None:
+        movie = MovieModel.query.filter(
+            MovieModel.id == id, MovieModel.deleted_at.is_not(None)
+        ).first()
+    return movie
+
+
+def _candidates(
+    batch_size: int,
+    cold_after: Optional[timedelta],
+    below_popularity: Optional[float],
+):
+    cold = []
+    if cold_after is not None:
+        cold.append(MovieModel.updated < datetime.utcnow() - cold_after)
+    if below_popularity is not None:
+        cold.append(MovieModel._99popularity < below_popularity)
+    condition = MovieModel.deleted_at.is_not(None)
+    if cold:
+        condition = db.or_(condition, db.and_(*cold))
+    return (
+        db.select(
+            MovieModel.id,
+            MovieModel.name,
+            MovieModel.director,
+            MovieModel.director_id,
+            MovieModel.imdb_score,
+            MovieModel._99popularity,
+            MovieModel.updated,
+            MovieModel.version,
+            MovieModel.deleted_at,
+        )
+        .where(condition)
+        .order_by(MovieModel.id)
+        .limit(batch_size)
+        # Concurrent jobs (PostgreSQL) take different batches
+        .with_for_update(skip_locked=True)
+    )
+
+
+def _genres(ids) -> dict:
+    genres = {id: [] for id in ids}
+    rows = db.session.execute(
+        db.select(movie_genre_association.c.movie_id, GenreModel.id, GenreModel.name)
+        .join(GenreModel, GenreModel.id == movie_genre_association.c.genre_id)
+        .where(movie_genre_association.c.movie_id.in_(ids))
+        .order_by(GenreModel.id)
+    )
+    for movie_id, id, name in rows:
+        genres[movie_id].append({"id": id, "name": name})
+    return genres
+
+
+def archive_batch(
+    batch_size: int,
+    cold_after: Optional[timedelta] = None,
+    below_popularity: Optional[float] = None,
+) -> int:
+    """Move up to `batch_size` movies to the archive and commit.
+
+    Deleted movies are always archived. Live ones are when they match every
+    given criterion.
+
+    Args:
+        cold_after (timedelta): Archive live movies not updated for this long
+        below_popularity (float): Archive live movies less popular than this
+
+    Returns:
+        int: Number of movies archived
+    """
+    rows = db.session.execute(
+        _candidates(batch_size, cold_after, below_popularity)
+    ).all()
+    if not rows:
+        db.session.rollback()
+        return 0
+
+    ids = [row.id for row in rows]
+    genres = _genres(ids)
+    now = datetime.utcnow()
+    db.session.execute(
+        MovieArchiveModel.__table__.insert(),
+        [
+            {**row._asdict(), "genres": genres[row.id], "archived_at": now}
+            for row in rows
+        ],
+    )
+    for row in rows:
+        if row.deleted_at is None:
+            # Deleted movies already left the live set when they were deleted
+            before = {
+                "id": row.id,
+                "name": row.name,
+                "director": row.director,
+                "imdb_score": row.imdb_score,
+                "_99popularity": row._99popularity,
+                "genres": sorted(genre["name"] for genre in genres[row.id]),
+            }
+            record_change(db.session, MovieChange(ARCHIVE, row.id, before=before))
+
+    for table in (movie_genre_association, favorites_association):
+        db.session.execute(db.delete(table).where(table.c.movie_id.in_(ids)))
+    db.session.execute(
+        db.delete(MovieModel.__table__).where(MovieModel.__table__.c.id.in_(ids))
+    )
+    db.session.commit()
+    return len(rows)
+
+
+def archive(
+    batch_size: int = 1000,
+    cold_after: Optional[timedelta] = None,
+    below_popularity: Optional[float] = None,
+) -> int:
+    """Archive batches (see `archive_batch`) until no movie qualifies.
+
+    Returns:
+        int: Number of movies archived
+    """
+    archived = 0
+    while True:
+        count = archive_batch(batch_size, cold_after, below_popularity)
+        archived += count
+        if count < batch_size:
+            return archived
@@ -3,9 +3,9 @@ from datetime import timedelta
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from flask_jwt_extended import create_access_token
-from passlib.hash import pbkdf2_sha256
 
 from db import db
+from ratelimit import limiter
 
 
 from schema import (
@@ -29,6 +29,7 @@ class UserRegistration(MethodView):
     @blp.response(409, ErrorResponseSchema, description="Admin already registered")
     @blp.response(500, ErrorResponseSchema, description="Unexpected error")
     @blp.response(201, description="Admin created", schema=RegisterAdminResponseSchema)
+    @limiter.limit("5/minute")
     def post(self, user_data):
         """Create a new admin user
 
@@ -41,6 +42,8 @@ class UserRegistration(MethodView):
         if AdminModel.query.filter(AdminModel.email == user_data["email"]).first():
             abort(409, message="A user with that username already exists.")
 
+        from passlib.hash import pbkdf2_sha256
+
         admin_user = AdminModel(
             email=user_data["email"],
             password=pbkdf2_sha256.hash(user_data["password"]),
@@ -61,6 +64,7 @@ class UserLogin(MethodView):
     @blp.arguments(AdminLoginSchema)
     @blp.response(400, ErrorResponseSchema, description="Login failed. Bad credentials")
     @blp.response(200, LoginAdminResponseSchema)
+    @limiter.limit("10/minute")
     def post(self, user_data):
         """Route for authenticating an admin user
 
@@ -72,6 +76,9 @@ class UserLogin(MethodView):
         """
         user = AdminModel.query.filter(AdminModel.email == user_data["email"]).first()
 
+        # passlib is imported on first use to keep worker startup fast
+        from passlib.hash import pbkdf2_sha256
+
         if user and pbkdf2_sha256.verify(user_data["password"], user.password):
             access_token = create_access_token(
                 identity=user.email,
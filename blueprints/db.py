@@ -1,9 +1,8 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint
-from flask_jwt_extended import create_access_token
-from passlib.hash import pbkdf2_sha256
 
 from data.data import load_sample_data, clear_data
+from outbox import lag
 
 
 blp = Blueprint("Database", __name__, description="Database related helpers")
@@ -30,3 +29,11 @@ class dbDataClear(MethodView):
         """Clear all data from database. Does not drop tables."""
         clear_data()
         return "Clear success", 200
+
+
+@blp.route("/outbox/lag", methods=["GET"])
+class OutboxLag(MethodView):
+    @blp.response(200)
+    def get(self):
+        """Pending outbox rows and age in seconds of the oldest one"""
+        return lag()
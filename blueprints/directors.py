@@ -0,0 +1,111 @@
+from flask import request
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+
+from db import db
+import postgres
+import projection
+
+from schema import DirectorPageSchema, MovieKeysetPageSchema, ErrorResponseSchema
+from models import DirectorModel, MovieModel
+
+
+blp = Blueprint(
+    "Directors",
+    __name__,
+    description="Operations on Directors",
+    url_prefix="/directors",
+)
+
+MAX_PAGE_SIZE = 100
+
+
+def _page_args():
+    after = request.args.get("after", default=0, type=int)
+    limit = request.args.get("limit", default=25, type=int)
+    return after, max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    """Smallest string greater than every string starting with `prefix`."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+@blp.route("/", methods=["GET"])
+class Directors(MethodView):
+    @blp.response(200, DirectorPageSchema, description="Page of directors")
+    def get(self):
+        """List directors
+
+        Pages through directors ordered by id. Pass `after` (the `next` value of
+        the previous page) to fetch the following page. With `q`, returns up to
+        `limit` directors whose name starts with `q`, ordered by name.
+
+        Returns:
+            DirectorPageSchema: Directors and the cursor of the next page
+        """
+        after, limit = _page_args()
+        prefix = request.args.get("q", "").strip().lower()
+
+        if prefix:
+            # Range on the name_key index instead of a LIKE scan
+            directors = (
+                DirectorModel.query.filter(
+                    DirectorModel.name_key >= prefix,
+                    DirectorModel.name_key < _prefix_upper_bound(prefix),
+                )
+                .order_by(DirectorModel.name_key)
+                .limit(limit)
+                .all()
+            )
+            return {"directors": directors, "next": None}
+
+        directors = (
+            DirectorModel.query.filter(DirectorModel.id > after)
+            .order_by(DirectorModel.id)
+            .limit(limit)
+            .all()
+        )
+        next_cursor = directors[-1].id if len(directors) == limit else None
+        return {"directors": directors, "next": next_cursor}
+
+
+@blp.route("/<int:id>/movies", methods=["GET"])
+class DirectorMovies(MethodView):
+    @blp.response(404, ErrorResponseSchema, description="Director not found")
+    @blp.response(200, MovieKeysetPageSchema, description="Movies of the director")
+    @blp.doc(**projection.DOC)
+    def get(self, id):
+        """List all movies by a director
+
+        Args:
+            id (int): ID of the director
+
+        Returns:
+            MovieKeysetPageSchema: Movies ordered by id and the cursor of the next page
+        """
+        after, limit = _page_args()
+        if not db.session.get(DirectorModel, id):
+            abort(404, message=f"Director with id {id} not found")
+
+        projected = projection.requested()
+        if postgres.enabled():
+            columns, genres = projected.select_args()
+            movies = postgres.fetch_with_genres(
+                postgres.select_movies(columns)
+                .where(MovieModel.director_id == id, MovieModel.id > after)
+                .order_by(MovieModel.id)
+                .limit(limit),
+                genres,
+            )
+        else:
+            movies = (
+                MovieModel.live()
+                .filter(MovieModel.director_id == id, MovieModel.id > after)
+                .options(*projected.options())
+                .order_by(MovieModel.id)
+                .limit(limit)
+                .all()
+            )
+        next_cursor = movies[-1].id if len(movies) == limit else None
+        return {"movies": projected.dump(movies, many=True), "next": next_cursor}
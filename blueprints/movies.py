@@ -1,22 +1,55 @@
-from flask import request, jsonify
+from datetime import datetime
+
+from flask import request, jsonify, current_app
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from passlib.hash import pbkdf2_sha256
 from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 
 from db import db
 from cache import cache, custom_movie_key_generator
+from conditional import (
+    conditional,
+    catalog_etag,
+    catalog_version,
+    movie_etag,
+    remember_movie,
+)
+from idempotency import idempotent
+from ratelimit import limiter
+from upsert import upsert_movie
+import archive
+import changelog
+import moviecache
+import postgres
+import projection
+import searchcache
+import suggest
 
 from schema import (
     MovieResponseSchema,
+    MovieBatchSchema,
+    MovieIdsSchema,
+    SimilarMovieSchema,
     CreateMoviesSchema,
     UpdateMoviesSchema,
+    UpsertMovieSchema,
     ErrorResponseSchema,
     DeleteResponseSchema,
     PaginatedResponseSchema,
+    SuggestionSchema,
+    ChangeFeedSchema,
 )
-from models import MovieModel, GenreModel, UserModel
+from models import (
+    MovieModel,
+    GenreModel,
+    UserModel,
+    DirectorModel,
+    MovieSimilarModel,
+)
+from models.director import find_or_create_director
 
 
 blp = Blueprint(
@@ -24,11 +57,29 @@ blp = Blueprint(
 )
 
 
+def movie_list_cache_key() -> str:
+    """Cache key of a page of the movie list, for the current catalog version."""
+    args = request.args
+    return "movies#list#" + "#".join(
+        str(part)
+        for part in (
+            catalog_version(),
+            args.get("page"),
+            args.get("per_page"),
+            args.get("fields"),
+            args.get("include"),
+        )
+    )
+
+
 @blp.route("/", methods=["GET", "POST"])
 class Movies(MethodView):
     @blp.response(404, ErrorResponseSchema, description="No movies were found")
-    @cache.cached(timeout=10)  # Change timeout later or set explicitly
+    # Outside the cache, so cache hits are tagged and answer If-None-Match too
+    @conditional(catalog_etag)
+    @cache.cached(timeout=10, key_prefix=movie_list_cache_key)
     @blp.response(200, PaginatedResponseSchema, description="List of all movies")
+    @blp.doc(**projection.DOC)
     def get(self):
         """Gets all movies in the database
 
@@ -38,28 +89,45 @@ class Movies(MethodView):
 
         page = request.args.get("page", default=1, type=int)
         per_page = request.args.get("per_page", default=25, type=int)
-        movies = MovieModel.query.options(db.joinedload(MovieModel.genres)).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        if not movies:
-            abort(404, message="No movies found in the database.")
-
-        serialized_movies = MovieResponseSchema(many=True).dump(movies)
+        projected = projection.requested()
+        if postgres.enabled():
+            # Same defaults as paginate(error_out=False)
+            page = max(page, 1)
+            per_page = per_page if per_page > 0 else 20
+            total, movies = postgres.movie_page(
+                (page - 1) * per_page, per_page, *projected.select_args()
+            )
+        else:
+            # Same order as the PostgreSQL path; without it SQLite may answer
+            # from a partial index in its order, and pages shift
+            movies = (
+                MovieModel.live()
+                .options(*projected.options())
+                .order_by(MovieModel.id)
+                .paginate(page=page, per_page=per_page, error_out=False)
+            )
+            if not movies:
+                abort(404, message="No movies found in the database.")
+            page, per_page, total = movies.page, movies.per_page, movies.total
+
+        serialized_movies = projected.dump(movies, many=True)
         res_data = {
-            "page": movies.page,
-            "per_page": movies.per_page,
-            "total": movies.total,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
             "movies": serialized_movies,  # Include the list of movies in the response
         }
         serialized_data = PaginatedResponseSchema().dump(res_data)
         return serialized_data
 
     @jwt_required()
+    @idempotent
     @blp.arguments(CreateMoviesSchema)
     @blp.response(
         403, ErrorResponseSchema, description="No privileges to create new movies"
     )
     @blp.response(400, ErrorResponseSchema, description="Bad Input")
+    @blp.response(409, ErrorResponseSchema, description="Movie already exists")
     @blp.response(500, ErrorResponseSchema, description="Unexpected errror")
     @blp.response(201, MovieResponseSchema, description="New movie created.")
     def post(self, movie_data):
@@ -92,23 +160,32 @@ class Movies(MethodView):
                 genres_for_movie.append(genre)
 
         movie.genres.extend(genres_for_movie)
+        movie.director_ref = find_or_create_director(movie_data["director"])
         try:
             db.session.add(movie)
             db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            abort(
+                409,
+                message=f"Movie {movie_data['name']} by {movie_data['director']} "
+                "already exists. Use PUT /movies/<name> to replace it.",
+            )
         except Exception as e:
             print("Error: Unexpected error occurred ", e)
             db.session.rollback()
             abort(500, message="Unexpected error occurred ")
 
         serialized_movie = MovieResponseSchema().dump(movie)
-        cache.clear()
         return serialized_movie, 201
 
 
-@blp.route("<string:name>", methods=["GET", "PATCH", "DELETE"])
+@blp.route("<string:name>", methods=["GET", "PUT", "PATCH", "DELETE"])
 class FetchMovieByName(MethodView):
     @blp.response(404, ErrorResponseSchema, description="Movie not found")
     @blp.response(200, MovieResponseSchema, description="Movie with given name.")
+    @blp.doc(**projection.DOC)
+    @conditional(lambda name: movie_etag(name=name))
     def get(self, name):
         """Get a movie by name
 
@@ -118,17 +195,65 @@ class FetchMovieByName(MethodView):
         Returns:
             MovieSchema: Movie with the given name.
         """
-        movie = (
-            MovieModel.query.filter_by(name=name)
-            .options(db.joinedload(MovieModel.genres))
-            .first()
-        )
+        projected = projection.requested()
+        if postgres.enabled():
+            movie = postgres.movie_by_name(
+                name, *projected.select_args("name", "version")
+            )
+        else:
+            movie = (
+                MovieModel.live()
+                .filter_by(name=name)
+                .options(*projected.options("name", "version"))
+                .first()
+            )
 
         if not movie:
             abort(404, message=f"Movie with name {name} not found")
 
-        cache.set(f"movies#{name}", movie, timeout=10)
-        return movie
+        if projected == projection.FULL:
+            cache.set(f"movies#{name}", movie, timeout=10)
+        remember_movie(movie, by_name=True)
+        return projected.dump(movie)
+
+    @jwt_required()
+    @idempotent
+    @blp.arguments(UpsertMovieSchema)
+    @blp.response(
+        403, ErrorResponseSchema, description="No privileges to update movies"
+    )
+    @blp.response(500, ErrorResponseSchema, description="Unexpected error")
+    @blp.response(201, MovieResponseSchema, description="Movie created")
+    @blp.response(200, MovieResponseSchema, description="Movie replaced")
+    def put(self, movie_data, name):
+        """Create or replace the movie with this name by the given director
+
+        Retrying the request never creates a second movie.
+
+        Args:
+            movie_data (UpsertMovieSchema): Director, score, popularity and genres
+            name (string): Name of the movie
+
+        Returns:
+            MovieResponseSchema: Stored movie
+        """
+        try:
+            id, genres, created = upsert_movie(name, movie_data)
+            movie = {
+                "id": id,
+                "name": name,
+                "director": movie_data["director"],
+                "imdb_score": movie_data["imdb_score"],
+                "_99popularity": movie_data["_99popularity"],
+                "genres": [{"id": genre.id, "name": genre.name} for genre in genres],
+            }
+            db.session.commit()
+        except Exception as e:
+            print("Error: Unexpected error occurred ", e)
+            db.session.rollback()
+            abort(500, message="Unexpected error occurred ")
+
+        return movie, 201 if created else 200
 
     @jwt_required()
     @blp.arguments(UpdateMoviesSchema)
@@ -136,6 +261,11 @@ class FetchMovieByName(MethodView):
         403, ErrorResponseSchema, description="No privileges to update movies"
     )
     @blp.response(404, ErrorResponseSchema, description="Movie not found")
+    @blp.response(
+        409,
+        ErrorResponseSchema,
+        description="Movie changed concurrently, or name and director taken",
+    )
     @blp.response(500, ErrorResponseSchema, description="Unexpected error")
     @blp.response(200, MovieResponseSchema, description="Updated movie")
     def patch(self, update_data, name):
@@ -149,7 +279,8 @@ class FetchMovieByName(MethodView):
             MovieResponseSchema: Updated movie
         """
         movie = (
-            MovieModel.query.filter_by(name=name)
+            MovieModel.live()
+            .filter_by(name=name)
             .options(db.joinedload(MovieModel.genres))
             .first()
         )
@@ -159,34 +290,48 @@ class FetchMovieByName(MethodView):
         else:
             # Update the movie attributes
             movie.name = update_data.get("name", movie.name)
-            movie.director = update_data.get("director", movie.director)
+            if "director" in update_data:
+                movie.director = update_data["director"]
+                movie.director_ref = find_or_create_director(movie.director)
             movie.imdb_score = update_data.get("imdb_score", movie.imdb_score)
             movie._99popularity = update_data.get("_99popularity", movie._99popularity)
 
-        if "genres" in update_data:
-            # Clear existing genres
-            movie.genres = []
-            for genre_name in update_data["genres"]:
-                genre = GenreModel.query.filter_by(name=genre_name.strip()).first()
-                if genre:
-                    movie.genres.append(genre)
-                else:
-                    # Create a new genre if it doesn't exist
-                    new_genre = GenreModel(name=genre_name.strip())
-                    db.session.add(new_genre)
-                    movie.genres.append(new_genre)
-            try:
-                db.session.commit()
-                db.session.refresh(movie)
-            except Exception as e:
-                print("Error: Unexpected error occurred ", e)
-                db.session.rollback()
-                abort(500, message="Unexpected error occurred ")
-            cache.clear()
-            return movie
+        # Loading genres would flush the renamed movie, which can hit the natural
+        # key outside of the try below
+        with db.session.no_autoflush:
+            if "genres" in update_data:
+                # Clear existing genres
+                movie.genres = []
+                for genre_name in update_data["genres"]:
+                    genre = GenreModel.query.filter_by(name=genre_name.strip()).first()
+                    if genre:
+                        movie.genres.append(genre)
+                    else:
+                        # Create a new genre if it doesn't exist
+                        new_genre = GenreModel(name=genre_name.strip())
+                        db.session.add(new_genre)
+                        movie.genres.append(new_genre)
+
+        # The rollback expires the movie, so name the conflict up front
+        taken = f"Movie {movie.name} by {movie.director} already exists."
+        try:
+            db.session.commit()
+            db.session.refresh(movie)
+        except StaleDataError:
+            db.session.rollback()
+            abort(409, message=f"Movie {name} was changed, retry the update")
+        except IntegrityError:
+            db.session.rollback()
+            abort(409, message=taken)
+        except Exception as e:
+            print("Error: Unexpected error occurred ", e)
+            db.session.rollback()
+            abort(500, message="Unexpected error occurred ")
+        return movie
 
     @jwt_required()
     @blp.response(404, ErrorResponseSchema, description="Movie not found.")
+    @blp.response(409, ErrorResponseSchema, description="Movie changed concurrently")
     @blp.response(500, ErrorResponseSchema, description="Unexpected Error")
     @blp.response(204, DeleteResponseSchema, description="Movie deleted successfully")
     def delete(self, name):
@@ -199,7 +344,8 @@ class FetchMovieByName(MethodView):
             string: message indicating success or error
         """
         movie = (
-            MovieModel.query.filter_by(name=name)
+            MovieModel.live()
+            .filter_by(name=name)
             .options(db.joinedload(MovieModel.genres))
             .first()
         )
@@ -207,34 +353,63 @@ class FetchMovieByName(MethodView):
         if not movie:
             abort(404, f"Movie {name} not found")
         try:
-            db.session.delete(movie)
+            movie.deleted_at = datetime.utcnow()
             db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            abort(409, message=f"Movie {name} was changed, retry the delete")
         except Exception as e:
             print("Error: Unexpected Error occurred")
             db.session.rollback()
             abort(500, message="Unexpected Error occurred")
 
-        cache.clear()
         return {"message": "Item deleted."}
 
 
 @blp.route("<int:id>", methods=["GET", "PATCH", "DELETE"])
 class FetchMovieByID(MethodView):
     @blp.response(404, ErrorResponseSchema, description="Movie with ID not found")
+    @blp.response(410, ErrorResponseSchema, description="Movie was deleted")
     @blp.response(200, MovieResponseSchema, description="Movie response")
+    @blp.doc(**projection.DOC)
+    @conditional(lambda id: movie_etag(id=id))
     def get(self, id):
         """Get movie based on ID
 
+        Archived movies are served too, flagged with `archived`.
+
         Args:
             id (int): ID of the movie
 
         Returns:
             MovieResponseSchema: Response movie with given ID.
         """
-        return MovieModel.query.get_or_404(id)
+        projected = projection.requested()
+        if postgres.enabled():
+            movie = postgres.movie_by_id(id, *projected.select_args("version"))
+        else:
+            movie = (
+                MovieModel.live()
+                .filter_by(id=id)
+                .options(*projected.options("version"))
+                .first()
+            )
+        if not movie:
+            movie = archive.find(id)
+            if not movie:
+                abort(404, message=f"Movie with id {id} not found")
+            if movie.deleted_at is not None:
+                abort(410, message=f"Movie with id {id} was deleted")
+        remember_movie(movie)
+        return projected.dump(movie)
 
     @blp.arguments(UpdateMoviesSchema)
     @blp.response(404, ErrorResponseSchema, description="Movie with ID not found")
+    @blp.response(
+        409,
+        ErrorResponseSchema,
+        description="Movie changed concurrently, or name and director taken",
+    )
     @blp.response(500, ErrorResponseSchema, description="Unexpected error")
     @blp.response(200, MovieResponseSchema, description="Movie updated")
     @jwt_required()
@@ -248,128 +423,344 @@ class FetchMovieByID(MethodView):
         Returns:
             MovieResponseSchema: Returns updated movie.
         """
-        movie = MovieModel.query.get_or_404(id)
+        movie = MovieModel.live().filter_by(id=id).first_or_404()
 
         if movie:
             # Update the movie attributes
             movie.name = update_data.get("name", movie.name)
-            movie.director = update_data.get("director", movie.director)
+            if "director" in update_data:
+                movie.director = update_data["director"]
+                movie.director_ref = find_or_create_director(movie.director)
             movie.imdb_score = update_data.get("imdb_score", movie.imdb_score)
             movie._99popularity = update_data.get("_99popularity", movie._99popularity)
 
-        if "genres" in update_data:
-            # Clear existing genres
-            movie.genres = []
-            for genre_name in update_data["genres"]:
-                genre = GenreModel.query.filter_by(name=genre_name.strip()).first()
-                if genre:
-                    movie.genres.append(genre)
-                else:
-                    # Create a new genre if it doesn't exist
-                    new_genre = GenreModel(name=genre_name.strip())
-                    db.session.add(new_genre)
-                    movie.genres.append(new_genre)
-
+        # Loading genres would flush the renamed movie, which can hit the natural
+        # key outside of the try below
+        with db.session.no_autoflush:
+            if "genres" in update_data:
+                # Clear existing genres
+                movie.genres = []
+                for genre_name in update_data["genres"]:
+                    genre = GenreModel.query.filter_by(name=genre_name.strip()).first()
+                    if genre:
+                        movie.genres.append(genre)
+                    else:
+                        # Create a new genre if it doesn't exist
+                        new_genre = GenreModel(name=genre_name.strip())
+                        db.session.add(new_genre)
+                        movie.genres.append(new_genre)
+
+        # The rollback expires the movie, so name the conflict up front
+        taken = f"Movie {movie.name} by {movie.director} already exists."
         try:
             db.session.commit()
             db.session.refresh(movie)
+        except StaleDataError:
+            db.session.rollback()
+            abort(409, message=f"Movie with id {id} was changed, retry the update")
+        except IntegrityError:
+            db.session.rollback()
+            abort(409, message=taken)
         except Exception as e:
             print("Error: Unexpected exception occurred ", e)
             db.session.rollback()
             abort(500, message="Unexpected exception occurred")
 
-        cache.clear()
         return movie
 
     @jwt_required()
     @blp.response(404, ErrorResponseSchema, description="Movie not found")
+    @blp.response(409, ErrorResponseSchema, description="Movie changed concurrently")
     @blp.response(500, ErrorResponseSchema, description="Unexpected error")
     @blp.response(204, DeleteResponseSchema, description="Movie deleted")
     def delete(self, id):
         """Delete a  movie from the database"""
-        movie = MovieModel.query.get_or_404(id)
+        movie = MovieModel.live().filter_by(id=id).first_or_404()
         try:
-            db.session.delete(movie)
+            movie.deleted_at = datetime.utcnow()
             db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            abort(409, message=f"Movie with id {id} was changed, retry the delete")
         except Exception as e:
             print("Unexpected exception occurred ", e)
             db.session.rollback()
-        cache.clear()
         return {"message": "Item deleted."}
 
 
+def search_query(name, director, min_rating, max_rating, popularity, genres):
+    """SQL query for the search filters, ordered by popularity."""
+    query = MovieModel.live()
+    if name:
+        query = query.filter(MovieModel.name.ilike(f"%{name}%"))
+    if director:
+        # Match against the (much smaller) director table, then use the FK index
+        director_ids = db.select(DirectorModel.id).where(
+            DirectorModel.name.ilike(f"%{director}%")
+        )
+        query = query.filter(MovieModel.director_id.in_(director_ids))
+
+    # Filter by IMDb score range (between min and max)
+    if min_rating is not None:
+        query = query.filter(MovieModel.imdb_score >= min_rating)
+    if max_rating is not None:
+        query = query.filter(MovieModel.imdb_score <= max_rating)
+
+    if popularity is not None:
+        query = query.filter(MovieModel._99popularity == popularity)
+
+    if genres:
+        genre_conds = [MovieModel.genres.any(name=gen) for gen in genres]
+        query = query.filter(or_(*genre_conds))
+
+    return query.order_by(MovieModel._99popularity.asc(), MovieModel.id.asc())
+
+
+def find_movie_ids(params, offset, limit):
+    """Ids of the movies matching canonical search params, in result order.
+
+    Returns:
+        tuple: Total number of matches and up to `limit` ids from `offset` on
+    """
+    model = None
+    # Text filters are not covered by the read model
+    if (
+        current_app.config["SEARCH_READ_MODEL"]
+        and not params["name"]
+        and not params["director"]
+    ):
+        # NumPy is only imported when the read model is enabled
+        import readmodel
+
+        model = readmodel.ensure_built(current_app.config["READ_MODEL_MAX_AGE"])
+
+    if model is not None and model.usable:
+        return model.search(
+            params["min_rating"],
+            params["max_rating"],
+            params["popularity"],
+            params["genres"],
+            offset,
+            limit,
+        )
+
+    query = search_query(**params)
+    ids = [
+        id
+        for (id,) in query.with_entities(MovieModel.id).offset(offset).limit(limit)
+    ]
+    if offset == 0 and len(ids) < limit:
+        return len(ids), ids
+    return query.order_by(None).count(), ids
+
+
+def fetch_movies_in_order(ids, projected=projection.FULL):
+    """Load the movies with the given ids, in the order of `ids`.
+
+    Only the fields of `projected` (see projection.Projection) are loaded.
+    """
+    if postgres.enabled():
+        return postgres.movies_by_ids(ids, *projected.select_args())
+    movies = {
+        movie.id: movie
+        for movie in MovieModel.live()
+        .filter(MovieModel.id.in_(ids))
+        .options(*projected.options())
+        .all()
+    }
+    return [movies[id] for id in ids if id in movies]
+
+
 @blp.route("/search", methods=["GET"])
 class SearchMovies(MethodView):
     @blp.response(404, description="No matching criteria", schema=ErrorResponseSchema)
-    @cache.cached(timeout=100)
     @blp.response(
         200,
         PaginatedResponseSchema,
         description="List of movies that match the search criteria.",
     )
+    @blp.doc(**projection.DOC)
+    @limiter.limit("20/second")
+    @conditional(catalog_etag)
     def get(self):
         """Get a list of movies that match the search criteria
 
         Returns:
             MovieResponseSchema: Result of search
         """
-        name = request.args.get("name")
-        director = request.args.get("director")
-        min_rating = request.args.get("min_rating")
-        maxscore = request.args.get("max_rating")
-        popularity = request.args.get("popularity")
-        genres = request.args.get("genres")
+        params = searchcache.canonical_params(request.args)
+        projected = projection.requested()
 
-        page = request.args.get("page", default=1, type=int)
+        page = max(request.args.get("page", default=1, type=int), 1)
         per_page = request.args.get("per_page", default=25, type=int)
-
-        if genres:
-            genre = genres.split(",")
-
-        query = MovieModel.query
-        if name:
-            query = query.filter(MovieModel.name.ilike(f"%{name}%"))
-        if director:
-            query = query.filter(MovieModel.director.ilike(f"%{director}%"))
-
-        # Filter by IMDb score range (between min and max)
-        if min_rating:
-            query = query.filter(MovieModel.imdb_score >= float(min_rating))
-        if maxscore:
-            query = query.filter(MovieModel.imdb_score <= float(maxscore))
-
-        if popularity:
-            query = query.filter(MovieModel._99popularity == float(popularity))
-
-        if genres:
-            genre_conds = [MovieModel.genres.any(name=gen) for gen in genre] or []
-            query = query.filter(or_(*genre_conds))
-
-        # Execute the query and fetch the results
-        movies = query.order_by(MovieModel._99popularity.asc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        per_page = per_page if per_page > 0 else 20
+        offset = (page - 1) * per_page
+
+        key = searchcache.search_key(params)
+        serialized_data = searchcache.get_page(key, page, per_page, projected.key)
+        if serialized_data is not None:
+            return serialized_data
+        total, page_ids = searchcache.get_ids(
+            key,
+            offset,
+            per_page,
+            lambda offset, limit: find_movie_ids(params, offset, limit),
         )
 
-        if not movies or movies.total == 0:
+        if total == 0:
             abort(404, "No movies with the criteria specified was found.")
 
-        serialized_movies = MovieResponseSchema(many=True).dump(movies)
+        serialized_movies = projected.dump(
+            fetch_movies_in_order(page_ids, projected), many=True
+        )
         res_data = {
-            "page": movies.page,
-            "per_page": movies.per_page,
-            "total": movies.total,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
             "movies": serialized_movies,  # Include the list of movies in the response
         }
         serialized_data = PaginatedResponseSchema().dump(res_data)
+        searchcache.set_page(key, page, per_page, serialized_data, projected.key)
         return serialized_data
 
 
+def movie_batch(ids):
+    """Movies with the given ids in request order, and the ids not found."""
+    if len(ids) > moviecache.MAX_IDS:
+        abort(400, message=f"At most {moviecache.MAX_IDS} ids per request")
+    projected = projection.requested()
+    found = moviecache.get_movies(ids)
+    ids = list(dict.fromkeys(ids))
+    return {
+        "movies": projected.dump([found[id] for id in ids if id in found], many=True),
+        "missing": [id for id in ids if id not in found],
+    }
+
+
+@blp.route("/mget", methods=["GET", "POST"])
+class MovieBatch(MethodView):
+    @blp.response(400, ErrorResponseSchema, description="Bad ids")
+    @blp.response(200, MovieBatchSchema, description="Movies in request order")
+    @blp.doc(**projection.DOC)
+    @conditional(catalog_etag)
+    def get(self):
+        """Get many movies by ID
+
+        `ids` is a comma-separated list of movie ids. Movies come back in the
+        order of `ids`, duplicates once; unknown and deleted ones are listed
+        in `missing`.
+
+        Returns:
+            MovieBatchSchema: Movies with the given ids
+        """
+        try:
+            ids = [int(id) for id in request.args.get("ids", "").split(",") if id]
+        except ValueError:
+            abort(400, message="ids must be a comma-separated list of integers")
+        return movie_batch(ids)
+
+    @blp.arguments(MovieIdsSchema)
+    @blp.response(400, ErrorResponseSchema, description="Too many ids")
+    @blp.response(200, MovieBatchSchema, description="Movies in request order")
+    @blp.doc(**projection.DOC)
+    def post(self, data):
+        """Get many movies by ID, for id lists too long for a URL
+
+        Returns:
+            MovieBatchSchema: Movies with the ids of the body, like GET
+        """
+        return movie_batch(data["ids"])
+
+
+@blp.route("/<int:id>/similar", methods=["GET"])
+class SimilarMovies(MethodView):
+    @blp.response(404, ErrorResponseSchema, description="Movie not found")
+    @blp.response(200, SimilarMovieSchema(many=True), description="Similar movies")
+    @blp.doc(**projection.DOC)
+    def get(self, id):
+        """Movies similar to a movie, most similar first
+
+        Neighbours are precomputed from genres and co-favourites by
+        `flask catalog build-similar`; movies added since have none yet.
+
+        Returns:
+            SimilarMovieSchema: Up to `limit` (default 10) similar movies
+        """
+        limit = max(1, request.args.get("limit", default=10, type=int))
+        projected = projection.requested()
+        row = db.session.get(MovieSimilarModel, id)
+        ids, scores = (row.similar_ids, row.scores) if row is not None else ([], [])
+        found = moviecache.get_movies([id, *ids])
+        # Movies deleted or archived since the build keep their row until the
+        # next one
+        movie = found.get(id)
+        if movie is None or movie.get("archived"):
+            abort(404, message=f"Movie with id {id} not found")
+
+        similar = []
+        for similar_id, score in zip(ids, scores):
+            movie = found.get(similar_id)
+            # Skip neighbours deleted or archived since the build
+            if movie is not None and not movie.get("archived"):
+                similar.append({**projected.dump(movie), "similarity": score})
+                if len(similar) == limit:
+                    break
+        return similar
+
+
+@blp.route("/suggest", methods=["GET"])
+class SuggestMovies(MethodView):
+    @blp.response(200, SuggestionSchema(many=True), description="Matching titles")
+    @limiter.limit("30/second")
+    @conditional(catalog_etag)
+    def get(self):
+        """Typeahead suggestions for movie names
+
+        Returns the most popular movies whose normalized name starts with `q`.
+        Served from an in-memory index, not cached per keystroke.
+
+        Returns:
+            SuggestionSchema: Up to `limit` (default 10, max 50) suggestions
+        """
+        prefix = request.args.get("q", "")
+        limit = request.args.get("limit", default=10, type=int)
+        index = suggest.ensure_built(current_app.config["SUGGEST_MAX_AGE"])
+        return index.suggest(prefix, limit)
+
+
+@blp.route("/changes", methods=["GET"])
+class MovieChanges(MethodView):
+    @blp.response(200, ChangeFeedSchema, description="Catalog changes in order")
+    def get(self):
+        """Changes to movies, genres and their associations
+
+        Returns the entries with a sequence number greater than `since`
+        (default 0), at most `limit` (default 500, max 5000). Pass `last_seq`
+        as the next `since` until `has_more` is false. Deleted items appear
+        as entries with op "delete" and no payload, and so do movies moved to
+        the archive, with op "archive": they are still served by id. A
+        "reset" entry means the whole catalog was cleared.
+
+        Returns:
+            ChangeFeedSchema: Batch of changes and the cursor of the next batch
+        """
+        since = request.args.get("since", default=0, type=int)
+        limit = max(1, min(request.args.get("limit", default=500, type=int), 5000))
+        changes = changelog.changes_since(since, limit)
+        return {
+            "changes": changes,
+            "last_seq": changes[-1].seq if changes else since,
+            "has_more": len(changes) == limit,
+        }
+
+
 @blp.route("/<int:id>/favourite", methods=["POST"])
 @blp.route("/<string:name>/favourite", methods=["DELETE"])
 class FavoriteMovie(MethodView):
     @jwt_required()
     @blp.response(404, ErrorResponseSchema)
     @blp.response(200, MovieResponseSchema)
+    @blp.doc(**projection.DOC)
     def post(self, id):
         """Favourite a movie based on ID
 
@@ -379,7 +770,8 @@ class FavoriteMovie(MethodView):
         Returns:
             MovieResponseSchema: Response movie favourited with given ID.
         """
-        movie = MovieModel.query.get_or_404(id)
+        projected = projection.requested()
+        movie = MovieModel.live().filter_by(id=id).first_or_404()
         user_creds = get_jwt_identity()
 
         user = UserModel.query.get_or_404(user_creds["id"])
@@ -391,7 +783,7 @@ class FavoriteMovie(MethodView):
         db.session.add(user)
         db.session.commit()
 
-        return MovieResponseSchema().dump(movie)
+        return projected.dump(movie)
 
     @jwt_required()
     @blp.response(204, DeleteResponseSchema)
@@ -0,0 +1,88 @@
+from flask import request
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+
+from conditional import conditional, catalog_etag
+import stats
+
+from schema import ErrorResponseSchema, ScoreStatsSchema, StatsPageSchema
+
+
+blp = Blueprint(
+    "Stats",
+    __name__,
+    description="Score statistics of the catalog",
+    url_prefix="/stats",
+)
+
+MAX_PAGE_SIZE = 500
+
+
+@blp.route("/", methods=["GET"])
+class CatalogStats(MethodView):
+    @blp.response(200, ScoreStatsSchema, description="Scores of all movies")
+    @conditional(catalog_etag)
+    def get(self):
+        """Score statistics of the whole catalog
+
+        `histogram` counts movies per unit-wide imdb_score bucket, from
+        [0, 1) to [9, 10].
+
+        Returns:
+            ScoreStatsSchema: Number of movies, mean, standard deviation and
+                histogram of their scores
+        """
+        return stats.summary(stats.CATALOG) or {
+            "count": 0,
+            "histogram": [0] * stats.BUCKETS,
+        }
+
+
+@blp.route("/genres", methods=["GET"])
+class GenreStats(MethodView):
+    @blp.response(200, ScoreStatsSchema(many=True), description="Scores by genre")
+    @conditional(catalog_etag)
+    def get(self):
+        """Score statistics of every genre, ordered by name
+
+        Returns:
+            ScoreStatsSchema: Statistics of the movies of each genre
+        """
+        _, genres = stats.summaries(stats.GENRE)
+        return genres
+
+
+@blp.route("/directors", methods=["GET"])
+class DirectorStats(MethodView):
+    @blp.response(200, StatsPageSchema, description="Scores by director")
+    @conditional(catalog_etag)
+    def get(self):
+        """Score statistics of directors, those with the most movies first
+
+        Returns:
+            StatsPageSchema: A page (`page`, `per_page`) of director statistics
+        """
+        page = max(request.args.get("page", default=1, type=int), 1)
+        per_page = request.args.get("per_page", default=25, type=int)
+        per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+        total, directors = stats.summaries(
+            stats.DIRECTOR, (page - 1) * per_page, per_page, by_count=True
+        )
+        return {"page": page, "per_page": per_page, "total": total, "items": directors}
+
+
+@blp.route("/directors/<string:name>", methods=["GET"])
+class DirectorStatsByName(MethodView):
+    @blp.response(404, ErrorResponseSchema, description="No movies by director")
+    @blp.response(200, ScoreStatsSchema, description="Scores of a director")
+    @conditional(catalog_etag)
+    def get(self, name):
+        """Score statistics of the movies of a director
+
+        Returns:
+            ScoreStatsSchema: Statistics of the director's movies
+        """
+        summary = stats.summary(stats.DIRECTOR, name)
+        if summary is None:
+            abort(404, message=f"No movies by director {name}")
+        return summary
@@ -4,9 +4,10 @@ from flask import request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
-from passlib.hash import pbkdf2_sha256
 
 from db import db
+from ratelimit import limiter
+import projection
 
 
 from schema import (
@@ -17,7 +18,7 @@ from schema import (
     RegisterResponseSchema,
     ErrorResponseSchema,
 )
-from models import UserModel
+from models import MovieModel, UserModel
 
 
 blp = Blueprint(
@@ -37,6 +38,7 @@ class UserRegistration(MethodView):
     @blp.response(
         201, RegisterResponseSchema, description="User registration successful"
     )
+    @limiter.limit("5/minute")
     def post(self, user_data):
         """Create a new user.
 
@@ -49,6 +51,8 @@ class UserRegistration(MethodView):
         if UserModel.query.filter(UserModel.email == user_data["email"]).first():
             abort(409, message="A user with that username already exists.")
 
+        from passlib.hash import pbkdf2_sha256
+
         user = UserModel(
             email=user_data["email"],
             password=pbkdf2_sha256.hash(user_data["password"]),
@@ -74,6 +78,7 @@ class UserLogin(MethodView):
         LoginResponseSchema,
         description="User Login success.",
     )
+    @limiter.limit("10/minute")
     def post(self, user_data):
         """Login a user
 
@@ -85,6 +90,9 @@ class UserLogin(MethodView):
         """
         user = UserModel.query.filter(UserModel.email == user_data["email"]).first()
 
+        # passlib is imported on first use to keep worker startup fast
+        from passlib.hash import pbkdf2_sha256
+
         if user and pbkdf2_sha256.verify(user_data["password"], user.password):
             access_token = create_access_token(
                 identity={"email": user.email, "id": user.id},
@@ -101,7 +109,22 @@ class AboutMe(MethodView):
     @jwt_required()
     @blp.response(401, ErrorResponseSchema, description="Invalid credentials")
     @blp.response(200, AboutMeResponseSchema, description="Profile information of user")
+    @blp.doc(**projection.DOC)
     def get(self):
+        """Profile of the user, with their favourite movies
+
+        `fields` and `include` (see projection) apply to the movies.
+        """
         user = get_jwt_identity()
+        projected = projection.requested()
         me = UserModel.query.get_or_404(user["id"])
-        return AboutMeResponseSchema().dump(me)
+        favourites = (
+            MovieModel.live()
+            .filter(MovieModel.favourited_by.any(UserModel.id == me.id))
+            .options(*projected.options())
+            .order_by(MovieModel.id)
+            .all()
+        )
+        profile = AboutMeResponseSchema(exclude=("favourite_movies",)).dump(me)
+        profile["favourite_movies"] = projected.dump(favourites, many=True)
+        return profile
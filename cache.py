@@ -1,6 +1,8 @@
 from flask_caching import Cache
 from flask import request
 
+from events import on_change, on_reset
+
 cache = Cache()
 
 
@@ -8,3 +10,21 @@ def custom_movie_key_generator():
     name = request.view_args["name"]
 
     return f"movie#{name}"
+
+
+@on_change
+def invalidate_movie_views(changes):
+    """Drop the cached views that may contain the changed movies."""
+    names = {
+        movie["name"]
+        for change in changes
+        for movie in (change.before, change.after)
+        if movie is not None
+    }
+    if names:
+        cache.delete_many(*(f"movies#{name}" for name in names))
+
+
+@on_reset
+def clear_cache():
+    cache.clear()
@@ -0,0 +1,129 @@
+"""Change feed of the catalog.
+
+Every transaction that writes movies, genres or their associations appends
+entries to the catalog_change table, in that same transaction, under a
+monotonically increasing sequence number. Mirrors poll
+`/movies/changes?since=<seq>` and apply the entries in order; deletes are
+recorded as tombstones (op "delete" without payload), and so are movies
+moved to the archive (op "archive"), which are still served by id. Clearing
+the catalog records a single "reset" entry.
+
+`compact` drops the entries older than a cutoff that a later entry for the
+same key supersedes, so the feed stays proportional to the catalog size
+while a mirror replaying it from 0 still ends up with the latest state.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from db import db
+from events import DELETE, INSERT, on_reset, on_transaction
+from models import ChangeModel, GenreModel
+
+
+RESET = "reset"
+
+
+def _entry(entity, key, op, payload=None) -> dict:
+    return {
+        "entity": entity,
+        "key": str(key),
+        "op": op,
+        "payload": payload,
+        "created": datetime.utcnow(),
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _capture_genres(session, flush_context):
+    genres = session.info.setdefault("genre_changes", [])
+    for obj in session.new:
+        if isinstance(obj, GenreModel):
+            payload = {"id": obj.id, "name": obj.name}
+            genres.append(_entry("genre", obj.id, INSERT, payload))
+    for obj in session.deleted:
+        if isinstance(obj, GenreModel):
+            genres.append(_entry("genre", obj.id, DELETE))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("genre_changes", None)
+
+
+@on_transaction
+def _record(session, changes):
+    entries = session.info.pop("genre_changes", [])
+    for change in changes:
+        if change.after is None:
+            entries.append(_entry("movie", change.id, change.op))
+        else:
+            entries.append(_entry("movie", change.id, change.op, change.after))
+
+        before = set(change.before["genres"]) if change.before else set()
+        after = set(change.after["genres"]) if change.after else set()
+        for genre in sorted(after - before):
+            entries.append(_entry("movie_genre", f"{change.id}:{genre}", INSERT))
+        for genre in sorted(before - after):
+            entries.append(_entry("movie_genre", f"{change.id}:{genre}", DELETE))
+
+    if not entries:
+        return
+    if session.get_bind().dialect.name == "postgresql":
+        # Serialize writers until commit so sequence order is commit order and
+        # a reader never skips a sequence number that commits late
+        session.execute(db.text("LOCK TABLE catalog_change IN EXCLUSIVE MODE"))
+    session.execute(ChangeModel.__table__.insert(), entries)
+
+
+@on_reset
+def _record_reset():
+    db.session.add(ChangeModel(entity="catalog", key="*", op=RESET))
+    db.session.commit()
+
+
+def last_seq() -> int:
+    """Sequence number of the latest entry, 0 when the feed is empty."""
+    return db.session.execute(db.select(db.func.max(ChangeModel.seq))).scalar() or 0
+
+
+def changes_since(since: int, limit: int) -> list:
+    """Up to `limit` entries with a sequence number greater than `since`."""
+    return (
+        ChangeModel.query.filter(ChangeModel.seq > since)
+        .order_by(ChangeModel.seq)
+        .limit(limit)
+        .all()
+    )
+
+
+def compact(older_than: timedelta, batch_size: int = 5000) -> int:
+    """Delete superseded entries older than `older_than`.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    cutoff = datetime.utcnow() - older_than
+    latest = db.aliased(ChangeModel)
+    superseded = (
+        db.select(ChangeModel.seq)
+        .where(
+            ChangeModel.created < cutoff,
+            db.exists().where(
+                latest.entity == ChangeModel.entity,
+                latest.key == ChangeModel.key,
+                latest.seq > ChangeModel.seq,
+            ),
+        )
+        .limit(batch_size)
+    )
+
+    deleted = 0
+    while True:
+        seqs = db.session.execute(superseded).scalars().all()
+        if not seqs:
+            return deleted
+        db.session.execute(db.delete(ChangeModel).where(ChangeModel.seq.in_(seqs)))
+        db.session.commit()
+        deleted += len(seqs)
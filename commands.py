@@ -0,0 +1,121 @@
+import time
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+import archive
+import changelog
+import ingest
+import outbox
+import stats
+from data.data import backfill_directors
+
+
+catalog_cli = AppGroup("catalog", help="Catalog maintenance commands.")
+outbox_cli = AppGroup("outbox", help="Outbox worker commands.")
+
+
+@catalog_cli.command("backfill-directors")
+def backfill_directors_command():
+    """Link existing movies to director rows. Run after migrating the schema."""
+    count = backfill_directors()
+    click.echo(f"Linked {count} movies to directors.")
+
+
+@outbox_cli.command("run")
+@click.option("--batch-size", default=500, show_default=True)
+@click.option("--interval", default=0.5, show_default=True, help="Idle poll interval")
+@click.option("--once", is_flag=True, help="Exit once the outbox is empty")
+def outbox_run_command(batch_size, interval, once):
+    """Apply pending movie side effects from the outbox."""
+    outbox.run(batch_size, interval, once)
+
+
+@outbox_cli.command("lag")
+def outbox_lag_command():
+    """Show the number of pending outbox rows and the age of the oldest."""
+    stats = outbox.lag()
+    click.echo(f"{stats['pending']} pending, lag {stats['lag_seconds']:.3f}s")
+
+
+@catalog_cli.command("compact-changes")
+@click.option("--older-than-days", default=7, show_default=True)
+def compact_changes_command(older_than_days):
+    """Drop change feed entries superseded by a later change of the same item."""
+    deleted = changelog.compact(timedelta(days=older_than_days))
+    click.echo(f"Deleted {deleted} change entries.")
+
+
+@catalog_cli.command("write-snapshot")
+@click.option("--path", help="Defaults to CATALOG_SNAPSHOT, else catalog.snap")
+def write_snapshot_command(path):
+    """Write a memory-mapped catalog snapshot for the read model to start from."""
+    import readmodel
+
+    path = path or current_app.config["CATALOG_SNAPSHOT"] or "catalog.snap"
+    stats = readmodel.write_snapshot(path)
+    click.echo(
+        f"Wrote {stats['count']} movies at change {stats['seq']} "
+        f"({stats['size'] / 2**20:.1f} MiB) to {path}."
+    )
+
+
+@catalog_cli.command("archive")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--cold-days", type=int, help="Also archive movies not updated since")
+@click.option(
+    "--below-popularity", type=float, help="Also archive movies less popular than"
+)
+@click.option("--interval", default=0.0, help="Run again every INTERVAL seconds")
+def archive_command(batch_size, cold_days, below_popularity, interval):
+    """Move deleted (and optionally cold) movies to the archive table."""
+    cold_after = timedelta(days=cold_days) if cold_days is not None else None
+    while True:
+        count = archive.archive(batch_size, cold_after, below_popularity)
+        click.echo(f"Archived {count} movies.")
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+@catalog_cli.command("build-similar")
+@click.option("--top-k", default=20, show_default=True, help="Neighbours per movie")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--workers", default=0, help="Processes to use; defaults to all CPUs")
+def build_similar_command(top_k, batch_size, workers):
+    """Recompute the similar movies served by /movies/<id>/similar."""
+    # NumPy is only imported by this job
+    import similar
+
+    stats = similar.build(top_k, batch_size, workers)
+    click.echo(
+        f"Stored neighbours of {stats['written']} of {stats['movies']} movies."
+    )
+
+
+@catalog_cli.command("rebuild-stats")
+def rebuild_stats_command():
+    """Recompute the score rollups served by /stats from the movie table."""
+    stats.rebuild()
+    click.echo("Rebuilt score statistics.")
+
+
+@catalog_cli.command("ingest")
+@click.argument("paths", nargs=-1, required=True)
+@click.option("--workers", default=0, help="Parsing processes; defaults to all CPUs")
+@click.option("--queue-size", default=0, help="Chunks parsed ahead of the writer")
+@click.option("--chunk-mb", default=8, show_default=True, help="NDJSON chunk size")
+@click.option("--rejects", default="rejects.ndjson", show_default=True)
+def ingest_command(paths, workers, queue_size, chunk_mb, rejects):
+    """Import movies from JSON, NDJSON and CSV files, directories or globs.
+
+    Rerun the same command to resume an interrupted import.
+    """
+    result = ingest.ingest(paths, workers, queue_size, chunk_mb * 2**20, rejects)
+    click.echo(
+        f"Loaded {result['loaded']} movies from {result['sources']} files "
+        f"({result['skipped']} of {result['chunks']} chunks already imported), "
+        f"rejected {result['rejected']} records (see {rejects})."
+    )
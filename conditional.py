@@ -0,0 +1,173 @@
+"""Conditional requests and compression for movie reads.
+
+ETags are derived from version counters kept in the cache, so a matching
+If-None-Match is answered with 304 before the view touches the database:
+
+- catalog ETags (lists, searches) combine a catalog version, bumped on every
+  commit that changes movies, with the request path and query;
+- movie ETags use the version column of the movie and whether it is
+  archived, remembered in the cache the first time the movie is served, and
+  the projection of the request (see projection), so each fieldset of a
+  movie has its own.
+
+JSON responses above COMPRESS_MIN_SIZE are compressed with brotli (when the
+`brotli` package is installed) or gzip. Compressed bodies of tagged responses
+are cached under their ETag, so cache hits are not compressed again.
+"""
+import gzip
+import hashlib
+import time
+from functools import wraps
+
+from flask import Response, after_this_request, request
+from werkzeug.http import unquote_etag
+
+import projection
+from cache import cache
+from events import on_change
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+
+CATALOG_VERSION_KEY = "catalog#version"
+ETAG_TIMEOUT = 300
+
+
+def catalog_version() -> int:
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a lost counter never repeats an old value
+        cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=0)
+        version = cache.get(CATALOG_VERSION_KEY) or time.time_ns() // 1000
+    return version
+
+
+def catalog_etag(**kwargs) -> str:
+    """ETag of a catalog-wide read, for the current request path and query."""
+    digest = hashlib.sha1(request.full_path.encode()).hexdigest()[:16]
+    return f'W/"c{catalog_version()}-{digest}"'
+
+
+def _movie_etag_key(id=None, name=None) -> str:
+    return f"movie#etag#{id}" if id is not None else f"movie#etag#name#{name}"
+
+
+def movie_etag(id=None, name=None):
+    """Remembered ETag of a movie, or None if it has to be loaded first."""
+    etag = cache.get(_movie_etag_key(id, name))
+    variant = projection.requested().key
+    if etag is None or not variant:
+        return etag
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:8]
+    return f'{etag[:-1]}-{digest}"'
+
+
+def remember_movie(movie, by_name: bool = False) -> None:
+    """Store the ETag of a movie that is about to be served."""
+    # Archiving does not change the version, but the response gains "archived"
+    archived = "-a" if getattr(movie, "archived", False) else ""
+    etag = f'W/"m{movie.id}-{movie.version}{archived}"'
+    key = _movie_etag_key(name=movie.name) if by_name else _movie_etag_key(movie.id)
+    cache.set(key, etag, timeout=ETAG_TIMEOUT)
+
+
+def conditional(etag_for):
+    """Answer If-None-Match before running the view and tag its response.
+
+    Args:
+        etag_for: Called with the URL arguments of the view; returns the current
+            ETag or None when it is not known without running the view
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            etag = etag_for(**kwargs)
+            if etag is not None and request.if_none_match.contains_weak(
+                unquote_etag(etag)[0]
+            ):
+                return Response(status=304, headers={"ETag": etag})
+
+            result = fn(*args, **kwargs)
+
+            # The view may have just remembered the ETag
+            etag = etag or etag_for(**kwargs)
+            if etag is not None:
+
+                @after_this_request
+                def tag(response):
+                    if response.status_code == 200:
+                        response.headers["ETag"] = etag
+                    return response
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+@on_change
+def _bump_versions(changes):
+    keys = []
+    for change in changes:
+        keys.append(_movie_etag_key(change.id))
+        for movie in (change.before, change.after):
+            if movie is not None:
+                keys.append(_movie_etag_key(name=movie["name"]))
+    cache.delete_many(*keys)
+    if cache.get(CATALOG_VERSION_KEY) is None:
+        catalog_version()
+    else:
+        # Atomic INCR on Redis
+        cache.cache.inc(CATALOG_VERSION_KEY)
+
+
+def _encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def init_app(app) -> None:
+    """Compress large JSON responses of `app`."""
+    min_size = app.config["COMPRESS_MIN_SIZE"]
+
+    @app.after_request
+    def compress(response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or response.mimetype != "application/json"
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = _encoding()
+        if encoding is None or (response.content_length or 0) < min_size:
+            return response
+
+        etag = response.headers.get("ETag")
+        key = f"compressed#{encoding}#{etag}"
+        body = cache.get(key) if etag else None
+        if body is None:
+            body = _compress(response.get_data(), encoding)
+            if etag:
+                cache.set(key, body, timeout=ETAG_TIMEOUT)
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        return response
@@ -3,7 +3,10 @@ from sqlalchemy.exc import SQLAlchemyError
 
 
 from db import db
-from models import MovieModel, GenreModel
+from events import notify_reset
+from ingest import ingest
+import postgres
+from models import MovieModel, DirectorModel
 
 """
 For 1-to-Many relationship. 
@@ -51,51 +54,18 @@ def load_sample_data() -> None:
     """
     Load the sample data provided.
 
-
+    Goes through the ingest pipeline: invalid or existing movies are skipped
+    and loading twice is a no-op, see ingest.ingest.
     """
     try:
-        with open("data/imdb.json", "r") as json_file:
-            json_data: list = json.load(json_file)
-
-            for item in json_data:
-                # Create a new movie entry
-                movie = MovieModel(
-                    name=item["name"],
-                    director=item["director"],
-                    imdb_score=item["imdb_score"],
-                    _99popularity=item["99popularity"],
-                )
-
-                # Create a list to hold genre objects for this movie
-                genres_for_movie = []
-
-                for genre_name in item["genre"]:
-                    # Check if the genre with this name already exists in the database
-                    existing_genre = GenreModel.query.filter_by(
-                        name=genre_name.strip()
-                    ).first()
-
-                    if existing_genre:
-                        genres_for_movie.append(existing_genre)
-                    else:
-                        # If it doesn't exist, create a new genre object
-                        genre = GenreModel(name=genre_name.strip())
-                        db.session.add(genre)
-                        genres_for_movie.append(genre)
-                        db.session.commit()
-
-                # Set the genres attribute for the movie to establish the association
-                movie.genres = genres_for_movie
-
-                # Atomic transactions to add movie entries to the database
-                db.session.add(movie)
-
-            db.session.commit()
-
-            print("Sample data loaded successfully")
-
-    except FileNotFoundError:
-        print("Sample data file not found")
+        result = ingest(["data/imdb.json"], workers=1)
+        if not result["sources"]:
+            print("Sample data file not found")
+            return
+        print(
+            "Sample data loaded successfully "
+            f"({result['loaded']} movies, {result['rejected']} rejected)"
+        )
     except SQLAlchemyError as err:
         print("SQL ERROR: %s", err)
     except Exception as e:
@@ -109,9 +79,52 @@ def clear_data() -> None:
     # Avoid foreign key violation
     # Clears childrens|Associations before parents
     try:
-        for table in reversed(meta.sorted_tables):
-            print("Clear table: ", table)
-            db.session.execute(table.delete())
+        if postgres.enabled():
+            postgres.truncate_all()
+        else:
+            for table in reversed(meta.sorted_tables):
+                print("Clear table: ", table)
+                db.session.execute(table.delete())
         db.session.commit()
+        notify_reset()
     except Exception as e:
         print(f"Error occured clearing tables: {e}")
+
+
+def backfill_directors() -> int:
+    """Create director rows for movies that are not linked to one yet.
+
+    Returns:
+        int: Number of movies linked to a director
+    """
+    names = (
+        db.session.execute(
+            db.select(MovieModel.director)
+            .where(MovieModel.director_id.is_(None))
+            .distinct()
+        )
+        .scalars()
+        .all()
+    )
+    known = set(db.session.execute(db.select(DirectorModel.name)).scalars())
+    missing = {name.strip() for name in names} - known
+    if missing:
+        db.session.execute(
+            DirectorModel.__table__.insert(),
+            [{"name": name, "name_key": name.lower()} for name in missing],
+        )
+
+    # Single correlated UPDATE instead of touching movies one by one
+    director_id = (
+        db.select(DirectorModel.id)
+        .where(DirectorModel.name == db.func.trim(MovieModel.director))
+        .scalar_subquery()
+    )
+    result = db.session.execute(
+        db.update(MovieModel)
+        .where(MovieModel.director_id.is_(None))
+        .values(director_id=director_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
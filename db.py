@@ -8,6 +8,8 @@ movie_genre_association = db.Table(
     "movie_genre_association",
     db.Column("movie_id", db.Integer, db.ForeignKey("movie.id")),
     db.Column("genre_id", db.Integer, db.ForeignKey("genre.id")),
+    # Genres of a movie without scanning the whole association
+    db.Index("movie_genre_movie_index", "movie_id", "genre_id"),
 )
 
 # Table association for Favorites and Movies
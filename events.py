@@ -0,0 +1,225 @@
+"""Write hooks for movies.
+
+Tracks the movies touched by a session and hands the net changes of each
+transaction to the registered listeners. Derived structures subscribe here
+instead of being updated from every write handler:
+
+- `on_transaction` listeners write derived rows in the same transaction;
+- `on_commit` listeners update in-process structures after the commit;
+- `on_change` listeners are side effects on shared state (caches). They run
+  after the commit, or from the outbox worker when OUTBOX_MODE is "worker".
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import MovieModel
+
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+# Left the live set for the archive, still served by id (see archive.py)
+ARCHIVE = "archive"
+
+_transaction_listeners: list = []
+_commit_listeners: list = []
+_change_listeners: list = []
+_reset_listeners: list = []
+
+
+@dataclass
+class MovieChange:
+    op: str
+    id: int
+    before: Optional[dict] = None
+    after: Optional[dict] = None
+
+
+def on_commit(fn: Callable) -> Callable:
+    """Register `fn(changes)` to be called with the movie changes of every commit."""
+    _commit_listeners.append(fn)
+    return fn
+
+
+def on_transaction(fn: Callable) -> Callable:
+    """Register `fn(session, changes)` to be called right before every commit.
+
+    `changes` may be empty: listeners can also record other writes of the
+    transaction.
+    """
+    _transaction_listeners.append(fn)
+    return fn
+
+
+def on_change(fn: Callable) -> Callable:
+    """Register `fn(changes)` as a side effect of movie changes.
+
+    Side effects must be idempotent: the outbox worker delivers changes at
+    least once, in batches spanning several transactions.
+    """
+    _change_listeners.append(fn)
+    return fn
+
+
+def deferred() -> bool:
+    """Whether side effects are left to the outbox worker."""
+    return has_app_context() and current_app.config["OUTBOX_MODE"] == "worker"
+
+
+def apply_side_effects(changes: list) -> None:
+    """Run the `on_change` listeners, raising their errors."""
+    for fn in _change_listeners:
+        fn(changes)
+
+
+def on_reset(fn: Callable) -> Callable:
+    """Register `fn()` to be called when the catalog is cleared or bulk loaded."""
+    _reset_listeners.append(fn)
+    return fn
+
+
+def notify_reset() -> None:
+    """Tell listeners that the catalog was cleared outside of the ORM."""
+    for fn in _reset_listeners:
+        fn()
+
+
+def snapshot(movie: MovieModel, before: bool = False) -> dict:
+    """Plain dict of the indexed fields of a movie.
+
+    Args:
+        movie (MovieModel): Movie to snapshot
+        before (bool): Use the values loaded before the pending changes
+
+    Returns:
+        dict: Movie fields, with genres as a sorted list of names
+    """
+    state = inspect(movie)
+
+    def value(key):
+        if before:
+            history = state.attrs[key].history
+            if history.deleted:
+                return history.deleted[0]
+        return getattr(movie, key)
+
+    genres = movie.genres
+    if before:
+        history = state.attrs.genres.history
+        if history.added or history.deleted:
+            genres = list(history.unchanged) + list(history.deleted)
+
+    return {
+        "id": movie.id,
+        "name": value("name"),
+        "director": value("director"),
+        "imdb_score": value("imdb_score"),
+        "_99popularity": value("_99popularity"),
+        "genres": sorted(genre.name for genre in genres),
+    }
+
+
+def _pending(session) -> dict:
+    return session.info.setdefault("movie_changes", {})
+
+
+def record_change(session, change: MovieChange) -> None:
+    """Record a movie change written with Core statements.
+
+    The flush hooks only see ORM writes; bulk and upsert statements report
+    their changes here so the listeners run on commit as usual.
+    """
+    pending = _pending(session)
+    earlier = pending.get(change.id)
+    if earlier is not None:
+        change.before = earlier.before
+        if earlier.op == INSERT:
+            change.op = INSERT
+    pending[change.id] = change
+
+
+@event.listens_for(Session, "before_flush")
+def _capture_before(session, flush_context, instances):
+    pending = _pending(session)
+    for obj in session.dirty:
+        if not isinstance(obj, MovieModel):
+            continue
+        if obj.id not in pending:
+            pending[obj.id] = MovieChange(UPDATE, obj.id, before=snapshot(obj, True))
+        if inspect(obj).attrs.genres.history.has_changes():
+            # Genre changes only touch the association table; touch the row
+            # too so its version (and ETag) changes
+            obj.updated = datetime.utcnow()
+    for obj in session.deleted:
+        if isinstance(obj, MovieModel) and obj.id not in pending:
+            pending[obj.id] = MovieChange(UPDATE, obj.id, before=snapshot(obj, True))
+
+
+@event.listens_for(Session, "after_flush")
+def _capture_after(session, flush_context):
+    pending = _pending(session)
+    for obj in session.new:
+        if isinstance(obj, MovieModel):
+            pending[obj.id] = MovieChange(INSERT, obj.id, after=snapshot(obj))
+    for obj in session.dirty:
+        if isinstance(obj, MovieModel) and obj.id in pending:
+            if obj.deleted_at is not None:
+                # Soft delete: the movie leaves the live set
+                pending[obj.id].op = DELETE
+                pending[obj.id].after = None
+            else:
+                pending[obj.id].after = snapshot(obj)
+    for obj in session.deleted:
+        if isinstance(obj, MovieModel) and obj.id in pending:
+            if pending[obj.id].op == INSERT:
+                # Created and deleted within the same transaction
+                del pending[obj.id]
+            else:
+                pending[obj.id].op = DELETE
+                pending[obj.id].after = None
+
+
+def _net_changes(session) -> list:
+    return [
+        change
+        for change in session.info.get("movie_changes", {}).values()
+        if change.op != UPDATE or change.before != change.after
+    ]
+
+
+@event.listens_for(Session, "before_commit")
+def _in_transaction(session):
+    if not _transaction_listeners:
+        return
+    # Flush first so every change of the transaction has been captured
+    session.flush()
+    changes = _net_changes(session)
+    for fn in _transaction_listeners:
+        fn(session, changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch(session):
+    changes = _net_changes(session)
+    session.info.pop("movie_changes", None)
+    if not changes:
+        return
+    listeners = _commit_listeners
+    if not deferred():
+        listeners = listeners + _change_listeners
+    for fn in listeners:
+        try:
+            fn(changes)
+        except Exception as e:
+            # The transaction is already committed; never fail the request here
+            print("Error: movie commit listener failed ", e)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("movie_changes", None)
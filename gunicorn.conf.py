@@ -0,0 +1,31 @@
+"""Gunicorn settings for the API: `gunicorn -c gunicorn.conf.py`.
+
+The app is created once in the master and forked into the workers, so the
+catalog structures built by `serving.preload` are shared copy-on-write.
+"""
+import gc
+import os
+
+os.environ.setdefault("APP_MODE", "serve")
+os.environ.setdefault("PRELOAD", "1")
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+preload_app = True
+
+# A collection while the app is loaded would leave holes in pages that the
+# workers then fill, copying them. serving.preload freezes what it built, so
+# collecting again is safe once the app is loaded
+gc.disable()
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded, before workers are forked
+    gc.enable()
+
+
+def post_fork(server, worker):
+    import serving
+
+    serving.post_fork()
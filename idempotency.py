@@ -0,0 +1,95 @@
+"""Replay of retried writes that carry an Idempotency-Key header.
+
+The first response to a key is stored in the cache for IDEMPOTENCY_TTL
+seconds, scoped to the client's identity, together with a fingerprint of
+the request. A retry with the same key and request gets the stored response
+back without touching the database; reusing a key for a different request
+is rejected with 422, and a retry arriving while the first request is
+still running gets 409.
+"""
+import hashlib
+from functools import wraps
+
+from flask import Response, current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from flask_smorest import abort
+
+from cache import cache
+
+
+MAX_KEY_LENGTH = 255
+# Seconds a key stays reserved by a request that has not finished
+PENDING_TIMEOUT = 60
+
+
+def _fingerprint() -> str:
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _cache_key(key: str) -> str:
+    scope = f"{get_jwt_identity()}#{key}".encode()
+    return f"idempotency#{hashlib.sha256(scope).hexdigest()}"
+
+
+def idempotent(fn):
+    """Store the response of a write and replay it for retries of the same key.
+
+    Place below `jwt_required` and above the `blp.arguments` and
+    `blp.response` decorators, so the serialized response is stored.
+    """
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            abort(400, message="Idempotency-Key is too long.")
+
+        cache_key = _cache_key(key)
+        fingerprint = _fingerprint()
+        stored = cache.get(cache_key)
+        if stored is None:
+            pending = {"fingerprint": fingerprint, "pending": True}
+            if not cache.add(cache_key, pending, timeout=PENDING_TIMEOUT):
+                stored = cache.get(cache_key) or pending
+        if stored is not None:
+            if stored["fingerprint"] != fingerprint:
+                abort(422, message="Idempotency-Key was used for another request.")
+            if stored.get("pending"):
+                abort(
+                    409,
+                    message="A request with this Idempotency-Key is in progress.",
+                    headers={"Retry-After": "1"},
+                )
+            return Response(
+                stored["body"],
+                status=stored["status"],
+                mimetype=stored["mimetype"],
+                headers={"Idempotent-Replayed": "true"},
+            )
+
+        try:
+            response = make_response(fn(*args, **kwargs))
+        except Exception:
+            # Nothing was written (or it was rolled back): let the client retry
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            cache.set(
+                cache_key,
+                {
+                    "fingerprint": fingerprint,
+                    "status": response.status_code,
+                    "mimetype": response.mimetype,
+                    "body": response.get_data(),
+                },
+                timeout=current_app.config["IDEMPOTENCY_TTL"],
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,363 @@
+"""Parallel import of movie files.
+
+Sources are files, directories (every .json, .ndjson, .jsonl and .csv file
+in them) or glob patterns. Each source is split into chunks: NDJSON files in
+byte ranges of about `chunk_bytes`, JSON and CSV files whole (a JSON document
+has to be parsed at once, and quoted CSV fields may span lines).
+
+Chunks are parsed and validated against CreateMoviesSchema in a process
+pool. The main process is the single writer: it imports one chunk per
+transaction, while at most `queue_size` parsed or parsing chunks wait for
+it, so parsing never runs far ahead of the database. Records may use the
+keys of the sample data ("99popularity", "genre"); CSV genres are separated
+by "|".
+
+Invalid records and movies that already exist (same name and director) are
+written to the reject file, one JSON object per line, instead of failing
+the import. Every imported chunk is recorded in the ingest_checkpoint table
+in the transaction that imports it, along with the change feed entries of
+its movies: running the same import again skips the chunks already done,
+and readers see each chunk as soon as it commits.
+"""
+import csv
+import glob
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from marshmallow import ValidationError
+
+from db import db
+from models import GenreModel, IngestCheckpointModel, MovieModel
+from models.director import find_or_create_director
+from schema import CreateMoviesSchema
+import postgres
+
+
+FORMATS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+FIELDS = ("name", "director", "imdb_score", "_99popularity", "genres")
+# Keys of data/imdb.json
+ALIASES = {"99popularity": "_99popularity", "genre": "genres"}
+CHUNK_BYTES = 8 * 2**20
+
+
+def sources(paths) -> list:
+    """Files to import from the given files, directories and glob patterns."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = [os.path.join(path, name) for name in os.listdir(path)]
+        elif os.path.exists(path):
+            matches = [path]
+        else:
+            matches = glob.glob(path, recursive=True)
+        files.extend(
+            sorted(
+                match
+                for match in matches
+                if os.path.isfile(match)
+                and os.path.splitext(match)[1].lower() in FORMATS
+            )
+        )
+    return [os.path.abspath(file) for file in dict.fromkeys(files)]
+
+
+def _fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _chunks(path: str, chunk_bytes: int) -> list:
+    """(path, offset, end) of the chunks of a source."""
+    size = os.path.getsize(path)
+    if FORMATS[os.path.splitext(path)[1].lower()] != "ndjson":
+        return [(path, 0, size)]
+    return [
+        (path, offset, min(offset + chunk_bytes, size))
+        for offset in range(0, max(size, 1), chunk_bytes)
+    ]
+
+
+class _Unparsable:
+    def __init__(self, text: str, error: str):
+        self.text = text
+        self.error = error
+
+
+def _ndjson(path: str, offset: int, end: int):
+    with open(path, "rb") as file:
+        if offset:
+            # The chunk starts at the first line starting at or after offset
+            file.seek(offset - 1)
+            file.readline()
+        while True:
+            position = file.tell()
+            if position >= end:
+                return
+            line = file.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            try:
+                yield position, json.loads(line)
+            except ValueError as e:
+                yield position, _Unparsable(line.decode(errors="replace"), str(e))
+
+
+def _records(path: str, offset: int, end: int):
+    """(position, record) of a chunk; positions are what rejects report."""
+    kind = FORMATS[os.path.splitext(path)[1].lower()]
+    if kind == "ndjson":
+        yield from _ndjson(path, offset, end)
+    elif kind == "csv":
+        with open(path, newline="", encoding="utf-8") as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+    else:
+        with open(path, encoding="utf-8") as file:
+            try:
+                data = json.load(file)
+            except ValueError as e:
+                yield 0, _Unparsable("", str(e))
+                return
+        for index, item in enumerate(data if isinstance(data, list) else [data]):
+            yield index, item
+
+
+def _movie(record) -> dict:
+    """Validated movie of a raw record; raises ValidationError."""
+    if isinstance(record, _Unparsable):
+        raise ValidationError(f"Invalid JSON: {record.error}")
+    if not isinstance(record, dict):
+        raise ValidationError("Not an object")
+    record = {ALIASES.get(key, key): value for key, value in record.items()}
+    if isinstance(record.get("genres"), str):
+        record["genres"] = record["genres"].split("|")
+    movie = CreateMoviesSchema().load(record)
+
+    errors = {
+        field: ["Missing data for required field."]
+        for field in FIELDS
+        if field not in movie
+    }
+    if errors:
+        raise ValidationError(errors)
+    movie["name"] = movie["name"].strip()
+    movie["director"] = movie["director"].strip()
+    if not movie["name"] or not movie["director"]:
+        raise ValidationError("Empty name or director")
+    genres = (genre.strip() for genre in movie["genres"])
+    movie["genres"] = list(dict.fromkeys(genre for genre in genres if genre))
+    return movie
+
+
+def _parse(chunk) -> dict:
+    """Parse and validate a chunk. Runs in the workers of the pool."""
+    path, offset, end = chunk
+    movies, positions, rejects = [], [], []
+    for position, record in _records(path, offset, end):
+        try:
+            movies.append(_movie(record))
+            positions.append(position)
+        except ValidationError as e:
+            if isinstance(record, _Unparsable):
+                record = record.text
+            rejects.append(
+                {
+                    "source": path,
+                    "position": position,
+                    "errors": e.messages,
+                    "record": record,
+                }
+            )
+    return {
+        "path": path,
+        "offset": offset,
+        "movies": movies,
+        "positions": positions,
+        "rejects": rejects,
+    }
+
+
+def _parsed(chunks: list, workers: int, queue_size: int):
+    """Parsed chunks in order, at most `queue_size` of them ahead of the writer."""
+    if workers == 1 or len(chunks) <= 1:
+        yield from map(_parse, chunks)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= queue_size:
+                yield pending.popleft().result()
+            pending.append(pool.submit(_parse, chunk))
+        while pending:
+            yield pending.popleft().result()
+
+
+def _existing(movies: list) -> set:
+    """(name, director) of the given movies that are already in the catalog."""
+    names = list({movie["name"] for movie in movies})
+    existing = set()
+    # Stay below the bound parameter limits of the drivers
+    for start in range(0, len(names), 500):
+        rows = (
+            db.session.execute(
+                db.select(MovieModel.name, MovieModel.director).where(
+                    MovieModel.name.in_(names[start : start + 500]),
+                    MovieModel.deleted_at.is_(None),
+                )
+            )
+        )
+        existing.update(tuple(row) for row in rows)
+    return existing
+
+
+def _add_movies(movies: list) -> None:
+    """Add movies through the ORM, so the write hooks see them."""
+    genres = {
+        genre.name: genre
+        for genre in GenreModel.query.filter(
+            GenreModel.name.in_(
+                list({name for movie in movies for name in movie["genres"]})
+            )
+        )
+    }
+    directors = {}
+    for item in movies:
+        movie = MovieModel(
+            name=item["name"],
+            director=item["director"],
+            imdb_score=item["imdb_score"],
+            _99popularity=item["_99popularity"],
+        )
+        for name in item["genres"]:
+            if name not in genres:
+                genres[name] = GenreModel(name=name)
+                db.session.add(genres[name])
+            movie.genres.append(genres[name])
+        if item["director"] not in directors:
+            directors[item["director"]] = find_or_create_director(item["director"])
+        movie.director_ref = directors[item["director"]]
+        db.session.add(movie)
+
+
+def _write(parsed: dict, fingerprint: str, rejects) -> tuple:
+    """Import a parsed chunk and its checkpoint in one transaction.
+
+    Returns:
+        tuple: Numbers of movies loaded and of records rejected
+    """
+    existing = _existing(parsed["movies"])
+    movies, rejected = [], list(parsed["rejects"])
+    for movie, position in zip(parsed["movies"], parsed["positions"]):
+        key = (movie["name"], movie["director"])
+        if key in existing:
+            rejected.append(
+                {
+                    "source": parsed["path"],
+                    "position": position,
+                    "errors": "Movie already exists",
+                    "record": movie,
+                }
+            )
+            continue
+        existing.add(key)
+        movies.append(movie)
+
+    # Both paths record the inserts in the change feed of this transaction
+    if postgres.enabled():
+        postgres.copy_movies(movies)
+    else:
+        _add_movies(movies)
+    db.session.add(
+        IngestCheckpointModel(
+            source=parsed["path"],
+            offset=parsed["offset"],
+            fingerprint=fingerprint,
+            loaded=len(movies),
+            rejected=len(rejected),
+        )
+    )
+    if rejects is not None:
+        for reject in rejected:
+            rejects.write(json.dumps(reject, default=str) + "\n")
+        # Before the commit: a crash in between repeats rejects, never loses
+        rejects.flush()
+    db.session.commit()
+    return len(movies), len(rejected)
+
+
+def _done(path: str, fingerprint: str) -> set:
+    """Offsets of the chunks of a source already imported."""
+    db.session.execute(
+        db.delete(IngestCheckpointModel).where(
+            IngestCheckpointModel.source == path,
+            IngestCheckpointModel.fingerprint != fingerprint,
+        )
+    )
+    return set(
+        db.session.execute(
+            db.select(IngestCheckpointModel.offset).where(
+                IngestCheckpointModel.source == path
+            )
+        ).scalars()
+    )
+
+
+def ingest(
+    paths,
+    workers: int = 0,
+    queue_size: int = 0,
+    chunk_bytes: int = CHUNK_BYTES,
+    rejects_path=None,
+) -> dict:
+    """Import movies from files; see the module documentation.
+
+    Args:
+        paths: Files, directories and glob patterns
+        workers (int): Parsing processes; defaults to the number of CPUs
+        queue_size (int): Chunks parsed ahead of the writer; defaults to
+            twice the number of workers
+        rejects_path (str): File the rejected records are appended to
+
+    Returns:
+        dict: Numbers of sources, chunks, chunks skipped as already
+            imported, movies loaded and records rejected
+    """
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or 2 * workers
+    files = sources(paths)
+    fingerprints = {path: _fingerprint(path) for path in files}
+    chunks, skipped = [], 0
+    for path in files:
+        done = _done(path, fingerprints[path])
+        for chunk in _chunks(path, chunk_bytes):
+            if chunk[1] in done:
+                skipped += 1
+            else:
+                chunks.append(chunk)
+    db.session.commit()
+
+    loaded = rejected = 0
+    rejects = open(rejects_path, "a", encoding="utf-8") if rejects_path else None
+    try:
+        for parsed in _parsed(chunks, workers, queue_size):
+            counts = _write(parsed, fingerprints[parsed["path"]], rejects)
+            loaded += counts[0]
+            rejected += counts[1]
+    except BaseException:
+        db.session.rollback()
+        raise
+    finally:
+        if rejects is not None:
+            rejects.close()
+    return {
+        "sources": len(files),
+        "chunks": len(chunks) + skipped,
+        "skipped": skipped,
+        "loaded": loaded,
+        "rejected": rejected,
+    }
@@ -2,3 +2,10 @@ from models.admin import AdminModel
 from models.user import UserModel
 from models.movies import MovieModel
 from models.genre import GenreModel
+from models.director import DirectorModel
+from models.outbox import OutboxModel
+from models.change import ChangeModel
+from models.archive import MovieArchiveModel
+from models.similar import MovieSimilarModel
+from models.stats import StatsRollupModel, ScoreHistogramModel
+from models.ingest import IngestCheckpointModel
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from db import db
+
+
+class MovieArchiveModel(db.Model):
+    """Movies moved out of the movie table by the archive job.
+
+    Rows keep the id the movie had, and its genres as a list of
+    {"id", "name"} objects, so they can be served like live movies.
+    """
+
+    __tablename__ = "movie_archive"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String, nullable=False)
+    director = db.Column(db.String, nullable=False)
+    director_id = db.Column(db.Integer)
+    imdb_score = db.Column(db.Float(precision=1), nullable=False)
+    _99popularity = db.Column(db.Float(precision=1), nullable=False)
+    genres = db.Column(db.JSON, nullable=False)
+    updated = db.Column(db.DateTime, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    # Null when the movie was archived for being cold, not deleted
+    deleted_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Served with the movie, see MovieResponseSchema
+    archived = True
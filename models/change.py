@@ -0,0 +1,23 @@
+from datetime import datetime
+from sqlalchemy import Index
+
+from db import db
+
+
+class ChangeModel(db.Model):
+    __tablename__ = "catalog_change"
+    # Never reuse a sequence number, even after the latest entries are deleted
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity = db.Column(db.String, nullable=False)
+    key = db.Column(db.String, nullable=False)
+    op = db.Column(db.String, nullable=False)
+    payload = db.Column(db.JSON)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Latest entry per entity, used by compaction
+change_key_idx = Index(
+    "catalog_change_key_index", ChangeModel.entity, ChangeModel.key, ChangeModel.seq
+)
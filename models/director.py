@@ -0,0 +1,31 @@
+from db import db
+
+
+class DirectorModel(db.Model):
+    __tablename__ = "director"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False, unique=True)
+    # Lower-cased name, used for case-insensitive prefix lookups
+    name_key = db.Column(db.String, nullable=False, index=True)
+
+    # One-to-many relationship with Movie
+    movies = db.relationship("MovieModel", back_populates="director_ref")
+
+
+def find_or_create_director(name: str) -> DirectorModel:
+    """Get the director with the given name, creating it if it doesn't exist.
+
+    Args:
+        name (string): Name of the director
+
+    Returns:
+        DirectorModel: Existing or newly added (uncommitted) director
+    """
+    name = name.strip()
+    with db.session.no_autoflush:
+        director = DirectorModel.query.filter_by(name=name).first()
+    if not director:
+        director = DirectorModel(name=name, name_key=name.lower())
+        db.session.add(director)
+    return director
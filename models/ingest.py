@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from db import db
+
+
+class IngestCheckpointModel(db.Model):
+    """A chunk of an ingest source that has been imported.
+
+    Written in the transaction that imports the chunk, so an interrupted
+    import resumes after the last committed chunk, never imports one twice.
+    """
+
+    __tablename__ = "ingest_checkpoint"
+
+    source = db.Column(db.String, primary_key=True)
+    offset = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    # Size and modification time of the source; chunks of a changed file
+    # are imported again
+    fingerprint = db.Column(db.String, nullable=False)
+    loaded = db.Column(db.Integer, nullable=False)
+    rejected = db.Column(db.Integer, nullable=False)
+    done_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -1,3 +1,4 @@
+from datetime import datetime
 from sqlalchemy import Index
 from db import db, movie_genre_association, favorites_association
 from models.user import UserModel
@@ -22,9 +23,26 @@ class MovieModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     director = db.Column(db.String, nullable=False)
+    director_id = db.Column(db.Integer, db.ForeignKey("director.id"))
     imdb_score = db.Column(db.Float(precision=1), nullable=False)
     _99popularity = db.Column(db.Float(precision=1), nullable=False)
 
+    # Server defaults fill in the rows that predate the columns
+    updated = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        server_default=db.func.now(),
+    )
+    # Bumped by SQLAlchemy on every UPDATE of the row; used for ETags. An
+    # UPDATE of a row changed since it was read raises StaleDataError
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Set when the movie is deleted; the archive job removes the row later
+    deleted_at = db.Column(db.DateTime)
+
+    director_ref = db.relationship("DirectorModel", back_populates="movies")
+
     # Define the many-to-many relationship with Genre
     genres = db.relationship(
         "GenreModel", secondary=movie_genre_association, back_populates="movies"
@@ -36,5 +54,44 @@ class MovieModel(db.Model):
         back_populates="favourite_movies",
     )
 
+    __mapper_args__ = {"version_id_col": version}
+    # Archived ids must never be handed out again
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    @classmethod
+    def live(cls):
+        """Query of the movies that are not deleted."""
+        return cls.query.filter(cls.deleted_at.is_(None))
+
+
+# Reads filter on `deleted_at IS NULL`, so the hot indexes only cover live
+# movies and do not grow with deleted ones
+LIVE = MovieModel.deleted_at.is_(None)
 
 movie_idx = Index("movie_index", MovieModel.id, MovieModel.name, unique=True)
+# Natural key: the same title can be filmed by several directors. Deleted
+# movies do not hold on to it
+movie_natural_key = Index(
+    "movie_natural_key",
+    MovieModel.name,
+    MovieModel.director,
+    unique=True,
+    sqlite_where=LIVE,
+    postgresql_where=LIVE,
+)
+# Serves "all films by X" as a range scan, ordered by id for keyset paging
+movie_director_idx = Index(
+    "movie_director_index",
+    MovieModel.director_id,
+    MovieModel.id,
+    sqlite_where=LIVE,
+    postgresql_where=LIVE,
+)
+# Search results are ordered by popularity
+movie_popularity_idx = Index(
+    "movie_popularity_index",
+    MovieModel._99popularity,
+    MovieModel.id,
+    sqlite_where=LIVE,
+    postgresql_where=LIVE,
+)
@@ -0,0 +1,12 @@
+from datetime import datetime
+
+from db import db
+
+
+class OutboxModel(db.Model):
+    __tablename__ = "outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from db import db
+
+
+class MovieSimilarModel(db.Model):
+    """Precomputed nearest neighbours of a movie, written by similar.build.
+
+    One row per movie, neighbours most similar first, so serving them is a
+    single primary key lookup.
+    """
+
+    __tablename__ = "movie_similar"
+
+    # No foreign key: rows outlive archived movies until the next build
+    movie_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    similar_ids = db.Column(db.JSON, nullable=False)
+    scores = db.Column(db.JSON, nullable=False)
+    built_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,39 @@
+from sqlalchemy import Index
+
+from db import db
+
+
+class StatsRollupModel(db.Model):
+    """Running imdb_score aggregates of the live movies of a dimension key.
+
+    Dimensions are "catalog" (key ""), "genre" and "director" (names).
+    Rows whose movies are all gone keep a count of 0 until the next rebuild.
+    """
+
+    __tablename__ = "stats_rollup"
+
+    dimension = db.Column(db.String, primary_key=True)
+    key = db.Column(db.String, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0.0)
+    score_squares = db.Column(db.Float, nullable=False, default=0.0)
+
+
+# Serves the keys of a dimension by number of movies (/stats/directors?by_count)
+stats_rollup_count_idx = Index(
+    "stats_rollup_count_index",
+    StatsRollupModel.dimension,
+    StatsRollupModel.count.desc(),
+    StatsRollupModel.key,
+)
+
+
+class ScoreHistogramModel(db.Model):
+    """Number of live movies of a dimension key per imdb_score bucket."""
+
+    __tablename__ = "stats_histogram"
+
+    dimension = db.Column(db.String, primary_key=True)
+    key = db.Column(db.String, primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
@@ -8,7 +8,8 @@ class UserModel(BaseModel):
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(80), unique=True, nullable=False)
-    password = db.Column(db.String(80), nullable=False)
+    # pbkdf2_sha256 hashes are 87 characters long
+    password = db.Column(db.String, nullable=False)
 
     favourite_movies = db.relationship(
         "MovieModel",
@@ -0,0 +1,75 @@
+"""Per-movie cache for fetching many movies by id.
+
+Each movie is cached whole, serialized, under its id. A batch of ids costs
+one MGET for the cached ones; the rest are loaded with a single IN query
+(genres in one batched query, or aggregated in the same one on PostgreSQL)
+and written back in one pipelined call. Projections are cut from the cached
+movies, so every fieldset shares the same entries.
+
+Entries are dropped when their movie changes and on catalog resets.
+"""
+import postgres
+import projection
+from cache import cache
+from events import on_change
+from models import MovieArchiveModel, MovieModel
+from schema import MovieResponseSchema
+
+
+MOVIE_TIMEOUT = 300
+# Largest batch of ids served in one request
+MAX_IDS = 500
+
+
+def _key(id: int) -> str:
+    return f"movie#id#{id}"
+
+
+def _load(ids: list) -> list:
+    if postgres.enabled():
+        movies = postgres.movies_by_ids(ids)
+    else:
+        movies = (
+            MovieModel.live()
+            .filter(MovieModel.id.in_(ids))
+            .options(*projection.FULL.options())
+            .all()
+        )
+    found = {movie.id for movie in movies}
+    missing = [id for id in ids if id not in found]
+    if missing:
+        # Archived movies are served by id too; deleted ones are not
+        movies += MovieArchiveModel.query.filter(
+            MovieArchiveModel.id.in_(missing),
+            MovieArchiveModel.deleted_at.is_(None),
+        ).all()
+    return movies
+
+
+def get_movies(ids: list) -> dict:
+    """Serialized movies with the given ids, from the cache where possible.
+
+    Returns:
+        dict: Movies by id; ids of unknown or deleted movies are left out
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+    cached = cache.get_many(*(_key(id) for id in ids))
+    movies = {id: movie for id, movie in zip(ids, cached) if movie is not None}
+
+    misses = [id for id in ids if id not in movies]
+    if misses:
+        loaded = MovieResponseSchema(many=True).dump(_load(misses))
+        for movie in loaded:
+            movies[movie["id"]] = movie
+        if loaded:
+            cache.set_many(
+                {_key(movie["id"]): movie for movie in loaded}, timeout=MOVIE_TIMEOUT
+            )
+    return movies
+
+
+@on_change
+def _invalidate(changes):
+    cache.delete_many(*(_key(change.id) for change in changes))
@@ -0,0 +1,84 @@
+"""Transactional outbox for movie side effects.
+
+With OUTBOX_MODE set to "worker", the movie changes of a transaction are
+written to the outbox table in that same transaction instead of being
+applied after the commit. A worker (`flask outbox run`) drains the table in
+batches and applies the side effects (cache invalidation, ...), so a write
+request costs a single commit whatever the number of derived structures.
+
+Rows are deleted only after their side effects succeeded: delivery is at
+least once.
+"""
+import time
+from dataclasses import asdict
+from datetime import datetime
+
+from db import db
+from events import MovieChange, apply_side_effects, deferred, on_transaction
+from models import OutboxModel
+
+
+TOPIC = "movie"
+
+
+@on_transaction
+def _write(session, changes):
+    if not changes or not deferred():
+        return
+    session.execute(
+        OutboxModel.__table__.insert(),
+        [{"topic": TOPIC, "payload": asdict(change)} for change in changes],
+    )
+
+
+def drain(batch_size: int = 500) -> int:
+    """Apply the side effects of one batch of outbox rows.
+
+    Returns:
+        int: Number of rows processed
+    """
+    rows = (
+        OutboxModel.query.filter_by(topic=TOPIC)
+        .order_by(OutboxModel.id)
+        .limit(batch_size)
+        .all()
+    )
+    if not rows:
+        return 0
+
+    # Raises on failure; the rows stay and are retried on the next batch
+    apply_side_effects([MovieChange(**row.payload) for row in rows])
+
+    # Delete by id: rows with lower ids may still be committing
+    db.session.execute(
+        db.delete(OutboxModel).where(OutboxModel.id.in_([row.id for row in rows]))
+    )
+    db.session.commit()
+    return len(rows)
+
+
+def lag() -> dict:
+    """Number of pending rows and age in seconds of the oldest one."""
+    pending, oldest = db.session.execute(
+        db.select(db.func.count(OutboxModel.id), db.func.min(OutboxModel.created))
+    ).one()
+    seconds = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    return {"pending": pending, "lag_seconds": seconds}
+
+
+def run(batch_size: int = 500, interval: float = 0.5, once: bool = False) -> None:
+    """Drain the outbox forever, sleeping `interval` seconds when it is empty."""
+    while True:
+        try:
+            processed = drain(batch_size)
+        except Exception as e:
+            db.session.rollback()
+            print("Error: outbox batch failed ", e)
+            processed = 0
+        if processed:
+            seconds = lag()["lag_seconds"]
+            print(f"Outbox: applied {processed} changes, lag {seconds:.3f}s")
+        if once and processed < batch_size:
+            return
+        if processed < batch_size:
+            time.sleep(interval)
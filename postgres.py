@@ -0,0 +1,311 @@
+"""PostgreSQL data path.
+
+The ORM code in the blueprints works on any database. When the engine is
+PostgreSQL, the bulk and hot paths use these functions instead:
+
+- bulk ingest with COPY FROM STDIN;
+- clearing the catalog with TRUNCATE ... RESTART IDENTITY CASCADE;
+- movie lists with the genres of each movie aggregated with array_agg, so a
+  page is a single round trip;
+- movie lookups by id and name through statements prepared once per
+  connection.
+
+Movies are returned as plain objects with the attributes of MovieModel that
+the API serves (and `version`, for ETags), not as ORM instances: they are
+for reading only.
+"""
+import csv
+import io
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+
+from db import db, movie_genre_association
+from events import INSERT, MovieChange, record_change
+from models import ChangeModel, DirectorModel, GenreModel, MovieModel
+
+
+LOOKUP_STATEMENT = """
+PREPARE {name} ({type}) AS
+SELECT m.id, m.name, m.director, m.imdb_score, m._99popularity, m.version,
+       array_remove(array_agg(g.id ORDER BY g.id), NULL) AS genre_ids,
+       array_remove(array_agg(g.name ORDER BY g.id), NULL) AS genre_names
+FROM movie m
+LEFT JOIN movie_genre_association a ON a.movie_id = m.id
+LEFT JOIN genre g ON g.id = a.genre_id
+WHERE m.{column} = $1 AND m.deleted_at IS NULL
+GROUP BY m.id
+ORDER BY m.id
+LIMIT 1
+"""
+PREPARED_LOOKUPS = {
+    "movie_by_id": ("integer", "id"),
+    "movie_by_name": ("text", "name"),
+}
+
+
+def enabled() -> bool:
+    """Whether the session is bound to PostgreSQL."""
+    return db.session.get_bind().dialect.name == "postgresql"
+
+
+def init_app(app) -> None:
+    """Prepare the lookup statements on every new PostgreSQL connection of `app`."""
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "postgresql":
+                event.listen(engine, "connect", _prepare)
+
+
+def _prepare(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, (type, column) in PREPARED_LOOKUPS.items():
+            cursor.execute(LOOKUP_STATEMENT.format(name=name, type=type, column=column))
+        dbapi_connection.commit()
+        connection_record.info["prepared"] = True
+    except Exception as e:
+        # Tables not created yet (e.g. `flask db upgrade`); lookups use plain SQL
+        print("Error: could not prepare movie lookups ", e)
+        dbapi_connection.rollback()
+    finally:
+        cursor.close()
+
+
+def select_movies(columns=None):
+    """SELECT of live movies, to filter and page.
+
+    Args:
+        columns: Movie columns to select; defaults to the served ones and
+            `version`
+    """
+    columns = columns or (
+        MovieModel.id,
+        MovieModel.name,
+        MovieModel.director,
+        MovieModel.imdb_score,
+        MovieModel._99popularity,
+        MovieModel.version,
+    )
+    return db.select(*columns).where(MovieModel.deleted_at.is_(None))
+
+
+def _movie(row) -> SimpleNamespace:
+    data = dict(row._mapping)
+    genres = [
+        SimpleNamespace(id=id, name=name)
+        for id, name in zip(data.pop("genre_ids"), data.pop("genre_names"))
+    ]
+    return SimpleNamespace(**data, genres=genres)
+
+
+def fetch_with_genres(query, genres: bool = True) -> list:
+    """Run a `select_movies()` query, aggregating the genres of each movie.
+
+    Args:
+        genres (bool): Aggregate the genres; when false, movies come without
+
+    Returns:
+        list: Movies ordered by id
+    """
+    page = query.subquery()
+    if not genres:
+        rows = db.session.execute(db.select(page).order_by(page.c.id))
+        return [SimpleNamespace(**row._mapping) for row in rows]
+    genre_ids = db.func.array_agg(aggregate_order_by(GenreModel.id, GenreModel.id))
+    genre_names = db.func.array_agg(aggregate_order_by(GenreModel.name, GenreModel.id))
+    rows = db.session.execute(
+        db.select(
+            page,
+            db.func.array_remove(genre_ids, None).label("genre_ids"),
+            db.func.array_remove(genre_names, None).label("genre_names"),
+        )
+        .outerjoin(
+            movie_genre_association, movie_genre_association.c.movie_id == page.c.id
+        )
+        .outerjoin(GenreModel, GenreModel.id == movie_genre_association.c.genre_id)
+        .group_by(*page.c)
+        .order_by(page.c.id)
+    )
+    return [_movie(row) for row in rows]
+
+
+def movie_page(offset: int, limit: int, columns=None, genres: bool = True):
+    """A page of all movies, ordered by id, and the total number of movies.
+
+    `columns` and `genres` are passed on to `select_movies` and
+    `fetch_with_genres`.
+    """
+    movies = fetch_with_genres(
+        select_movies(columns)
+        .add_columns(db.func.count().over().label("total"))
+        .order_by(MovieModel.id)
+        .offset(offset)
+        .limit(limit),
+        genres,
+    )
+    if movies:
+        total = movies[0].total
+    elif offset:
+        # Past the last page: the window count has no row to ride on
+        total = db.session.scalar(
+            db.select(db.func.count()).where(MovieModel.deleted_at.is_(None))
+        )
+    else:
+        total = 0
+    return total, movies
+
+
+def movies_by_ids(ids, columns=None, genres: bool = True) -> list:
+    """Movies with the given ids, in the order of `ids`."""
+    query = select_movies(columns).where(MovieModel.id.in_(ids))
+    movies = {movie.id: movie for movie in fetch_with_genres(query, genres)}
+    return [movies[id] for id in ids if id in movies]
+
+
+def _lookup(name: str, value, columns, genres: bool):
+    # The prepared statements serve whole movies
+    if columns is None and genres and db.session.connection().info.get("prepared"):
+        row = db.session.execute(db.text(f"EXECUTE {name}(:value)"), {"value": value})
+        row = row.first()
+        return _movie(row) if row else None
+    column = getattr(MovieModel, PREPARED_LOOKUPS[name][1])
+    query = select_movies(columns).where(column == value).order_by(MovieModel.id)
+    movies = fetch_with_genres(query.limit(1), genres)
+    return movies[0] if movies else None
+
+
+def movie_by_id(id: int, columns=None, genres: bool = True):
+    return _lookup("movie_by_id", id, columns, genres)
+
+
+def movie_by_name(name: str, columns=None, genres: bool = True):
+    return _lookup("movie_by_name", name, columns, genres)
+
+
+def _copy(table: str, columns, rows) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = db.session.connection().connection.cursor()
+    if hasattr(cursor, "copy_expert"):
+        cursor.copy_expert(statement, buffer)
+    else:
+        # psycopg 3
+        with cursor.copy(statement) as copy:
+            copy.write(buffer.getvalue())
+
+
+def _ids_by_name(model, rows: list) -> dict:
+    if rows:
+        db.session.execute(
+            insert(model).values(rows).on_conflict_do_nothing(index_elements=["name"])
+        )
+    names = [row["name"] for row in rows]
+    query = db.select(model.name, model.id).where(model.name.in_(names))
+    return dict(db.session.execute(query).all())
+
+
+def copy_movies(items) -> int:
+    """Insert movies, their genres and directors in the current transaction.
+
+    COPY bypasses the ORM flush hooks: every movie is reported with
+    `events.record_change`, so the change feed, the rollups and the caches
+    see the inserts when the transaction commits, like any other write.
+
+    Args:
+        items: Dicts with name, director, imdb_score, _99popularity and
+            genres (list of names)
+
+    Returns:
+        int: Number of movies inserted
+    """
+    items = list(items)
+    if not items:
+        return 0
+
+    genre_names = {name.strip() for item in items for name in item["genres"]}
+    genre_ids = _ids_by_name(GenreModel, [{"name": name} for name in genre_names])
+    director_names = {item["director"].strip() for item in items}
+    director_ids = _ids_by_name(
+        DirectorModel,
+        [{"name": name, "name_key": name.lower()} for name in director_names],
+    )
+
+    # Reserve the ids up front so associations can be copied too
+    ids = (
+        db.session.execute(
+            db.text(
+                "SELECT nextval(pg_get_serial_sequence('movie', 'id')) "
+                "FROM generate_series(1, :count)"
+            ),
+            {"count": len(items)},
+        )
+        .scalars()
+        .all()
+    )
+    now = datetime.utcnow().isoformat()
+    _copy(
+        "movie",
+        (
+            "id",
+            "name",
+            "director",
+            "director_id",
+            "imdb_score",
+            "_99popularity",
+            "updated",
+            "version",
+        ),
+        (
+            (
+                id,
+                item["name"],
+                item["director"],
+                director_ids[item["director"].strip()],
+                item["imdb_score"],
+                item["_99popularity"],
+                now,
+                1,
+            )
+            for id, item in zip(ids, items)
+        ),
+    )
+    _copy(
+        "movie_genre_association",
+        ("movie_id", "genre_id"),
+        (
+            (id, genre_ids[name])
+            for id, item in zip(ids, items)
+            for name in dict.fromkeys(name.strip() for name in item["genres"])
+        ),
+    )
+    for id, item in zip(ids, items):
+        after = {
+            "id": id,
+            "name": item["name"],
+            "director": item["director"],
+            "imdb_score": item["imdb_score"],
+            "_99popularity": item["_99popularity"],
+            "genres": sorted({name.strip() for name in item["genres"]}),
+        }
+        record_change(db.session, MovieChange(INSERT, id, after=after))
+    return len(items)
+
+
+def truncate_all() -> None:
+    """Empty every table in the current transaction."""
+    quote = db.session.get_bind().dialect.identifier_preparer.quote
+    tables = [
+        quote(table.name)
+        for table in db.metadata.sorted_tables
+        if table.name != ChangeModel.__tablename__
+    ]
+    db.session.execute(
+        db.text(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE")
+    )
+    # Mirrors hold change feed positions: keep numbering after the old entries
+    db.session.execute(db.text(f"TRUNCATE {ChangeModel.__tablename__}"))
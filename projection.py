@@ -0,0 +1,114 @@
+"""Sparse fieldsets for movie responses.
+
+`?fields=id,name` limits the fields of each movie in a response and
+`?include=genres` embeds its genres. Without either, movies are served whole
+as before. The projection reaches the SQL layer: only the requested columns
+are loaded, and genres only when they are included.
+
+Responses that depend on the projection (cached pages, ETags) carry
+`Projection.key` in their keys.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+from flask import request
+from flask_smorest import abort
+
+from db import db
+from models import MovieModel
+from schema import MovieResponseSchema
+
+
+FIELDS = ("id", "name", "director", "imdb_score", "_99popularity")
+EXPANSIONS = ("genres",)
+
+# OpenAPI parameters of the views that accept a projection
+DOC = {
+    "parameters": [
+        {
+            "in": "query",
+            "name": "fields",
+            "schema": {"type": "string"},
+            "description": f"Comma-separated movie fields: {', '.join(FIELDS)}",
+        },
+        {
+            "in": "query",
+            "name": "include",
+            "schema": {"type": "string"},
+            "description": "Comma-separated expansions: genres",
+        },
+    ]
+}
+
+
+@dataclass(frozen=True)
+class Projection:
+    fields: tuple
+    genres: bool
+
+    @property
+    def key(self) -> str:
+        """Cache key part; empty for whole movies."""
+        if self == FULL:
+            return ""
+        return ",".join(self.fields) + (";genres" if self.genres else "")
+
+    def columns(self, *extra) -> list:
+        """Movie columns to load: the id, the requested fields and `extra`."""
+        names = dict.fromkeys(("id",) + self.fields + extra)
+        return [getattr(MovieModel, name) for name in names]
+
+    def select_args(self, *extra) -> tuple:
+        """`columns` and `genres` arguments of the postgres movie functions."""
+        if self == FULL:
+            # Their defaults, which the prepared lookups serve
+            return None, True
+        return self.columns(*extra), self.genres
+
+    def options(self, *extra) -> list:
+        """Loader options for ORM movie queries."""
+        options = [db.load_only(*self.columns(*extra))]
+        if self.genres:
+            options.append(db.selectinload(MovieModel.genres))
+        return options
+
+    def dump(self, movies, many: bool = False):
+        return _schema(self, many).dump(movies)
+
+
+FULL = Projection(FIELDS, True)
+
+
+@lru_cache(maxsize=256)
+def _schema(projection: Projection, many: bool) -> MovieResponseSchema:
+    only = projection.fields + ("archived",)
+    if projection.genres:
+        only += ("genres",)
+    return MovieResponseSchema(only=only, many=many)
+
+
+def _names(value: str) -> list:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def requested() -> Projection:
+    """Projection asked for by the current request."""
+    fields = request.args.get("fields")
+    include = request.args.get("include")
+    if fields is None and include is None:
+        return FULL
+
+    names = _names(fields) if fields is not None else list(FIELDS)
+    expansions = _names(include) if include is not None else []
+    if "genres" in names:
+        names.remove("genres")
+        expansions.append("genres")
+    unknown = [name for name in names if name not in FIELDS] + [
+        name for name in expansions if name not in EXPANSIONS
+    ]
+    if unknown:
+        abort(400, message=f"Unknown fields: {', '.join(unknown)}")
+    # Canonical order, so equivalent requests share cache entries
+    return Projection(
+        tuple(field for field in FIELDS if field in names), "genres" in expansions
+    )
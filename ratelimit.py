@@ -0,0 +1,184 @@
+"""Rate limiting and admission control.
+
+Per-route budgets are token buckets declared on the views with
+`limiter.limit("5/minute")`. Buckets are keyed by route and client (JWT
+identity when a valid token is sent, remote address otherwise) and live
+either in process memory or in Redis, where all workers share them.
+
+Independently, at most MAX_CONCURRENT_REQUESTS requests are served at once
+per process; a request that cannot start within MAX_QUEUE_WAIT seconds is
+shed with 503 and Retry-After. The slots are a semaphore of the process, not
+shared through Redis: they bound the threads and connections of one worker,
+so a deployment serves up to (workers x MAX_CONCURRENT_REQUESTS) at once.
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_smorest import abort
+
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+# Local buckets kept before full (idle) ones are dropped
+MAX_LOCAL_BUCKETS = 100000
+
+# Refill, take and persist a bucket atomically
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(retry_after)
+"""
+
+
+def parse_rate(rate: str):
+    """Parse "<count>/<period>" into tokens per second and bucket size."""
+    count, period = rate.split("/")
+    count = int(count)
+    return count / PERIODS[period.strip()], count
+
+
+class LocalBuckets:
+    """Token buckets in process memory, one set per worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """Take a token from a bucket.
+
+        Returns:
+            float: 0 if a token was taken, else seconds until one is available
+        """
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) > MAX_LOCAL_BUCKETS:
+                self._prune(now)
+            tokens, ts, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - ts) * rate)
+            retry_after = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not retry_after:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return retry_after
+
+    def _prune(self, now: float) -> None:
+        # A full bucket behaves exactly like a missing one
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items() if bucket[2] > now
+        }
+
+
+class RedisBuckets:
+    """Token buckets in Redis, shared by every worker."""
+
+    def __init__(self, client):
+        self.client = client
+        self._take = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        retry_after = self._take(
+            keys=[f"ratelimit#{key}"], args=[rate, burst, time.time()]
+        )
+        return float(retry_after)
+
+
+class RateLimiter:
+    def __init__(self):
+        self.buckets = None
+        self._slots = None
+
+    def init_app(self, app, redis_client=None) -> None:
+        """Set up the buckets and the concurrency limit of `app`.
+
+        Args:
+            redis_client: Redis client for shared buckets; built from the
+                cache settings when RATELIMIT_STORAGE is "redis"
+        """
+        if app.config["RATELIMIT_STORAGE"] == "redis":
+            if redis_client is None:
+                import redis
+
+                redis_client = redis.Redis(
+                    host=app.config["CACHE_REDIS_HOST"],
+                    port=int(app.config["CACHE_REDIS_PORT"]),
+                    db=int(app.config["CACHE_REDIS_DB"]),
+                    password=app.config["CACHE_REDIS_PASSWORD"],
+                )
+            self.buckets = RedisBuckets(redis_client)
+        else:
+            self.buckets = LocalBuckets()
+
+        max_concurrent = app.config["MAX_CONCURRENT_REQUESTS"]
+        if max_concurrent:
+            self._slots = threading.BoundedSemaphore(max_concurrent)
+            app.before_request(self._admit)
+            app.teardown_request(self._release)
+
+    def _admit(self):
+        if not self._slots.acquire(timeout=current_app.config["MAX_QUEUE_WAIT"]):
+            abort(
+                503,
+                message="Server busy, retry later.",
+                headers={"Retry-After": "1"},
+            )
+        g.admitted = True
+
+    def _release(self, exc):
+        if g.pop("admitted", False):
+            self._slots.release()
+
+    def limit(self, rate: str):
+        """Limit a view to `rate` ("<count>/<second|minute|hour|day>") per client."""
+        tokens_per_second, burst = parse_rate(rate)
+
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if current_app.config["RATELIMIT_ENABLED"]:
+                    key = f"{request.endpoint}#{request.method}#{_client_key()}"
+                    retry_after = self.buckets.take(key, tokens_per_second, burst)
+                    if retry_after:
+                        abort(
+                            429,
+                            message="Too many requests.",
+                            headers={"Retry-After": str(math.ceil(retry_after))},
+                        )
+                return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+
+def _client_key() -> str:
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        # Invalid tokens are rejected by the view itself; limit by address
+        identity = None
+    if identity is None:
+        return f"ip:{request.remote_addr}"
+    if isinstance(identity, dict):
+        identity = identity.get("id", identity.get("email"))
+    return f"user:{identity}"
+
+
+limiter = RateLimiter()
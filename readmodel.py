@@ -0,0 +1,338 @@
+"""Column-oriented read model of the movie catalog.
+
+Keeps id, score, popularity and a genre bitmask per movie in NumPy arrays so
+the numeric part of a search (score range, popularity, genres, ordering by
+popularity) is answered with vectorized operations. Only the ids of the
+requested page are then loaded from the database.
+
+Rows built from the database are sorted by movie id and found by binary
+search, so the model holds no per-movie Python objects; `share` moves the
+columns to files mapped copy-on-write, which forked workers read from the
+page cache instead of each keeping a private copy.
+
+The model remembers the change feed position it reflects. Instead of
+scanning the catalog again it catches up on the feed, and at startup it is
+loaded from a catalog snapshot (see snapshot.py) when CATALOG_SNAPSHOT
+points to one.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+from flask import current_app
+
+import changelog
+from db import db, movie_genre_association
+from events import ARCHIVE, DELETE, on_commit, on_reset
+from models import MovieModel, GenreModel
+import snapshot
+
+
+# One bit per genre in a uint64 mask
+MAX_GENRES = 64
+COLUMNS = ("ids", "score", "popularity", "genres", "live")
+
+
+class CatalogReadModel:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop the catalog. The read model is rebuilt on next use."""
+        with self._lock:
+            self._allocate(0)
+            self._base = 0  # rows [0, _base) are sorted by movie id
+            self._slots = {}  # movie id -> row, for rows appended since
+            self._genre_bits = {}  # genre name -> bit position
+            self._order = None  # live rows sorted by (popularity, id)
+            self.seq = None  # last change feed entry reflected
+            self.built_at = None
+
+    def _allocate(self, capacity: int) -> None:
+        self.size = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.score = np.zeros(capacity, dtype=np.float64)
+        self.popularity = np.zeros(capacity, dtype=np.float64)
+        self.genres = np.zeros(capacity, dtype=np.uint64)
+        self.live = np.zeros(capacity, dtype=np.bool_)
+
+    def _grow(self) -> None:
+        capacity = max(1024, 2 * len(self.ids))
+        for column in COLUMNS:
+            old = getattr(self, column)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, column, new)
+
+    @property
+    def usable(self) -> bool:
+        """False once the catalog has more genres than fit in the bitmask."""
+        return len(self._genre_bits) <= MAX_GENRES
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, column).nbytes for column in COLUMNS)
+
+    def _row(self, id: int):
+        row = self._slots.get(id)
+        if row is None:
+            row = int(np.searchsorted(self.ids[: self._base], id))
+            if row == self._base or self.ids[row] != id:
+                return None
+        return row
+
+    def _mask(self, genre_names) -> int:
+        mask = 0
+        for name in genre_names:
+            if name not in self._genre_bits:
+                self._genre_bits[name] = len(self._genre_bits)
+            bit = self._genre_bits[name]
+            if bit < MAX_GENRES:
+                mask |= 1 << bit
+        return mask
+
+    @property
+    def genre_names(self) -> list:
+        """Genre names in bit order."""
+        return sorted(self._genre_bits, key=self._genre_bits.get)
+
+    def build(self, rows, genre_rows, seq=None) -> None:
+        """Replace the catalog.
+
+        Args:
+            rows: Iterable of (id, imdb_score, _99popularity)
+            genre_rows: Iterable of (movie_id, genre name)
+            seq: Change feed position the rows reflect
+        """
+        rows = list(rows)
+        with self._lock:
+            self._allocate(len(rows))
+            self._genre_bits = {}
+            names = {}
+            for movie_id, genre in genre_rows:
+                names.setdefault(movie_id, []).append(genre)
+            if rows:
+                ids, score, popularity = zip(*rows)
+                self.ids[:] = ids
+                self.score[:] = score
+                self.popularity[:] = popularity
+                self.genres[:] = [self._mask(names.get(id, ())) for id in ids]
+                self.live[:] = True
+                by_id = np.argsort(self.ids, kind="stable")
+                for column in COLUMNS:
+                    setattr(self, column, getattr(self, column)[by_id])
+            self.size = self._base = len(rows)
+            self._slots = {}
+            self._order = None
+            self.seq = seq
+            self.built_at = time.monotonic()
+
+    def load(self, snap) -> None:
+        """Replace the catalog with the columns of a snapshot, without copying."""
+        with self._lock:
+            for column in COLUMNS:
+                setattr(self, column, snap.columns[column])
+            self.size = self._base = snap.count
+            self._slots = {}
+            self._genre_bits = {name: bit for bit, name in enumerate(snap.genres)}
+            self._order = snap.columns["order"]
+            self.seq = snap.seq
+            self.built_at = time.monotonic()
+
+    def export(self) -> dict:
+        """Copies of the live columns, and the popularity order, for a snapshot."""
+        with self._lock:
+            columns = {
+                column: getattr(self, column)[: self.size].copy() for column in COLUMNS
+            }
+            columns["order"] = self._sorted().copy()
+            return columns
+
+    def upsert(self, movie: dict) -> None:
+        with self._lock:
+            row = self._row(movie["id"])
+            if row is None:
+                if self.size == len(self.ids):
+                    self._grow()
+                row = self.size
+                self.size += 1
+                self._slots[movie["id"]] = row
+            self.ids[row] = movie["id"]
+            self.score[row] = movie["imdb_score"]
+            self.popularity[row] = movie["_99popularity"]
+            self.genres[row] = self._mask(movie["genres"])
+            self.live[row] = True
+            self._order = None
+
+    def remove(self, id: int) -> None:
+        with self._lock:
+            row = self._row(id)
+            if row is not None:
+                self.live[row] = False
+                self._order = None
+
+    def search(
+        self,
+        min_rating=None,
+        max_rating=None,
+        popularity=None,
+        genres=None,
+        offset=0,
+        limit=25,
+    ):
+        """Filter and order the catalog like the SQL search does.
+
+        Returns:
+            tuple: Total number of matches and up to `limit` matching movie ids
+                from `offset` on, in order
+        """
+        with self._lock:
+            order = self._sorted()
+
+            # Filter in row order (contiguous scans), then pick hits in sort order
+            size = self.size
+            mask = np.ones(size, dtype=np.bool_)
+            if min_rating is not None:
+                mask &= self.score[:size] >= min_rating
+            if max_rating is not None:
+                mask &= self.score[:size] <= max_rating
+            if popularity is not None:
+                mask &= self.popularity[:size] == popularity
+            if genres:
+                wanted = sum(
+                    1 << self._genre_bits[name]
+                    for name in genres
+                    if name in self._genre_bits
+                )
+                mask &= (self.genres[:size] & np.uint64(wanted)) != 0
+
+            hits = order[mask[order]]
+            return len(hits), self.ids[hits[offset : offset + limit]].tolist()
+
+    def _sorted(self):
+        if self._order is None:
+            size = self.size
+            order = np.lexsort((self.ids[:size], self.popularity[:size]))
+            self._order = order[self.live[order]]
+        return self._order
+
+    def share(self, directory: str) -> None:
+        """Move the columns to `directory` and map them back copy-on-write.
+
+        Call before forking workers. Pages a worker writes to (upserts) become
+        private to it; growing the arrays copies them back to the heap.
+        """
+        with self._lock:
+            if not self.size:
+                return
+            os.makedirs(directory, exist_ok=True)
+            columns = {column: getattr(self, column)[: self.size] for column in COLUMNS}
+            columns["order"] = self._sorted()
+            for column, values in columns.items():
+                path = os.path.join(directory, f"{column}.npy")
+                np.save(path, values)
+                mapped = np.load(path, mmap_mode="c")
+                if column == "order":
+                    self._order = mapped
+                else:
+                    setattr(self, column, mapped)
+
+
+read_model = CatalogReadModel()
+# Change feed entries read per query when catching up
+CATCH_UP_BATCH = 5000
+
+
+def _genre_rows():
+    return db.session.execute(
+        db.select(movie_genre_association.c.movie_id, GenreModel.name).join(
+            GenreModel, GenreModel.id == movie_genre_association.c.genre_id
+        )
+    )
+
+
+def _rebuild() -> None:
+    # Read the position first: changes committing during the scan are applied
+    # again by the next catch up, which leaves rows as they are
+    seq = changelog.last_seq()
+    read_model.build(
+        db.session.execute(
+            db.select(
+                MovieModel.id, MovieModel.imdb_score, MovieModel._99popularity
+            ).where(MovieModel.deleted_at.is_(None))
+        ),
+        _genre_rows(),
+        seq,
+    )
+
+
+def catch_up() -> None:
+    """Apply the change feed entries recorded since the read model was built."""
+    while read_model.seq is not None:
+        entries = changelog.changes_since(read_model.seq, CATCH_UP_BATCH)
+        for entry in entries:
+            if entry.op == changelog.RESET:
+                _rebuild()
+                return
+            if entry.entity == "movie":
+                if entry.op in (DELETE, ARCHIVE):
+                    read_model.remove(int(entry.key))
+                else:
+                    read_model.upsert(entry.payload)
+            read_model.seq = entry.seq
+        if len(entries) < CATCH_UP_BATCH:
+            read_model.built_at = time.monotonic()
+            return
+    _rebuild()
+
+
+def ensure_built(max_age: float) -> CatalogReadModel:
+    """Build the read model if it is empty, catch up if older than `max_age` seconds.
+
+    The first build loads CATALOG_SNAPSHOT when it exists.
+    """
+    if read_model.built_at is None:
+        path = current_app.config["CATALOG_SNAPSHOT"]
+        if path and os.path.exists(path):
+            read_model.load(snapshot.CatalogSnapshot(path))
+            catch_up()
+        else:
+            _rebuild()
+    elif time.monotonic() - read_model.built_at > max_age:
+        catch_up()
+    return read_model
+
+
+def write_snapshot(path: str) -> dict:
+    """Write a catalog snapshot of the database to `path`.
+
+    Returns:
+        dict: Number of movies, change feed position and size in bytes
+    """
+    seq = changelog.last_seq()
+    rows = db.session.execute(
+        db.select(MovieModel.id, MovieModel.imdb_score, MovieModel._99popularity)
+        .where(MovieModel.deleted_at.is_(None))
+        .order_by(MovieModel.id)
+    ).all()
+    model = CatalogReadModel()
+    model.build(rows, _genre_rows(), seq)
+    size = snapshot.write(path, seq, model.export(), model.genre_names)
+    return {"count": len(rows), "seq": seq, "size": size}
+
+
+@on_commit
+def _apply_changes(changes):
+    if read_model.built_at is None:
+        return
+    for change in changes:
+        # Deleted or archived
+        if change.after is None:
+            read_model.remove(change.id)
+        else:
+            read_model.upsert(change.after)
+
+
+on_reset(read_model.clear)
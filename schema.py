@@ -44,6 +44,13 @@ class UpdateMoviesSchema(CreateMoviesSchema):
     genres = fields.List(fields.Str())
 
 
+class UpsertMovieSchema(Schema):
+    director = fields.Str(required=True)
+    imdb_score = fields.Float(required=True)
+    _99popularity = fields.Float(required=True)
+    genres = fields.List(fields.Str(), load_default=list)
+
+
 class MovieResponseSchema(Schema):
     id = fields.Int(dump_only=True)
     name = fields.Str()
@@ -51,6 +58,18 @@ class MovieResponseSchema(Schema):
     imdb_score = fields.Float()
     _99popularity = fields.Float()
     genres = fields.List(fields.Nested(GenreSchema))
+    # Only set on movies served from the archive
+    archived = fields.Bool(dump_only=True)
+
+
+class SimilarMovieSchema(MovieResponseSchema):
+    similarity = fields.Float(dump_only=True)
+
+
+class SuggestionSchema(Schema):
+    id = fields.Int(dump_only=True)
+    name = fields.Str()
+    _99popularity = fields.Float()
 
 
 class PaginatedResponseSchema(Schema):
@@ -60,6 +79,61 @@ class PaginatedResponseSchema(Schema):
     movies = fields.Nested((MovieResponseSchema(many=True)))
 
 
+class DirectorSchema(Schema):
+    id = fields.Int(dump_only=True)
+    name = fields.Str()
+
+
+class DirectorPageSchema(Schema):
+    directors = fields.List(fields.Nested(DirectorSchema))
+    next = fields.Int(allow_none=True, dump_only=True)
+
+
+class MovieIdsSchema(Schema):
+    ids = fields.List(fields.Int(), required=True)
+
+
+class MovieBatchSchema(Schema):
+    movies = fields.List(fields.Nested(MovieResponseSchema))
+    missing = fields.List(fields.Int(), dump_only=True)
+
+
+class MovieKeysetPageSchema(Schema):
+    movies = fields.List(fields.Nested(MovieResponseSchema))
+    next = fields.Int(allow_none=True, dump_only=True)
+
+
+class ScoreStatsSchema(Schema):
+    name = fields.Str(allow_none=True)
+    count = fields.Int()
+    mean_score = fields.Float(allow_none=True)
+    stddev_score = fields.Float(allow_none=True)
+    # Movies per unit-wide imdb_score bucket
+    histogram = fields.List(fields.Int())
+
+
+class StatsPageSchema(Schema):
+    page = fields.Int(dump_only=True)
+    per_page = fields.Int(dump_only=True)
+    total = fields.Int(dump_only=True)
+    items = fields.List(fields.Nested(ScoreStatsSchema))
+
+
+class ChangeSchema(Schema):
+    seq = fields.Int(dump_only=True)
+    entity = fields.Str()
+    key = fields.Str()
+    op = fields.Str()
+    payload = fields.Dict(allow_none=True)
+    created = fields.DateTime()
+
+
+class ChangeFeedSchema(Schema):
+    changes = fields.List(fields.Nested(ChangeSchema))
+    last_seq = fields.Int(dump_only=True)
+    has_more = fields.Bool(dump_only=True)
+
+
 class ErrorResponseSchema(Schema):
     code = fields.Int()
     message = fields.Str()
@@ -0,0 +1,131 @@
+"""Search result cache keyed on the canonical form of the search.
+
+Equivalent searches (parameter order, genre order, case and whitespace of
+text filters, "8" vs "8.0") share entries. The ordered ids matching a search
+are cached in blocks of BLOCK_SIZE, loaded as pages fall in them, so a broad
+search costs a page query, not a scan of every match; rendered pages are
+cached next to them.
+
+Entries are never deleted. Their keys embed generation counters, one per
+genre and one for the whole catalog: a search with genre filters uses the
+counters of its genres, any other search the catalog counter. A movie change
+increments the catalog counter and the counters of the genres of the movie
+before and after it, which orphans every entry the change may affect; the
+orphans expire on their timeout.
+"""
+import hashlib
+import json
+import time
+
+from cache import cache
+from events import on_change
+
+
+SEARCH_TIMEOUT = 100
+# Ids per cached block of a search
+BLOCK_SIZE = 1000
+CATALOG_GENERATION_KEY = "search#generation"
+
+
+def _text(value):
+    value = " ".join((value or "").split()).lower()
+    return value or None
+
+
+def _number(value):
+    try:
+        return float(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def canonical_params(args) -> dict:
+    """Normalized search filters from the request arguments."""
+    genres = {genre.strip() for genre in (args.get("genres") or "").split(",")}
+    return {
+        "name": _text(args.get("name")),
+        "director": _text(args.get("director")),
+        "min_rating": _number(args.get("min_rating")),
+        "max_rating": _number(args.get("max_rating")),
+        "popularity": _number(args.get("popularity")),
+        "genres": sorted(genre for genre in genres if genre),
+    }
+
+
+def _generation_keys(genres) -> list:
+    if not genres:
+        return [CATALOG_GENERATION_KEY]
+    return [f"{CATALOG_GENERATION_KEY}#genre#{genre}" for genre in genres]
+
+
+def _generations(keys: list) -> list:
+    generations = cache.get_many(*keys)
+    for i, generation in enumerate(generations):
+        if generation is None:
+            # Seed from the clock so a lost counter never repeats an old value
+            cache.add(keys[i], time.time_ns() // 1000, timeout=0)
+            generations[i] = cache.get(keys[i]) or time.time_ns() // 1000
+    return generations
+
+
+def search_key(params: dict) -> str:
+    """Key prefix of the entries of a search, as of the current generations."""
+    generations = _generations(_generation_keys(params["genres"]))
+    encoded = json.dumps([params, generations], sort_keys=True).encode()
+    return f"search#{hashlib.sha1(encoded).hexdigest()}"
+
+
+def get_ids(key: str, offset: int, limit: int, find) -> tuple:
+    """Total and ids of a search from `offset` on, from its cached blocks.
+
+    Args:
+        key (str): search_key of the search
+        find: find(offset, limit) -> (total, ids) loads a missing block
+
+    Returns:
+        tuple: Total number of matches and up to `limit` ids
+    """
+    first = offset // BLOCK_SIZE
+    blocks = range(first, (offset + max(limit, 1) - 1) // BLOCK_SIZE + 1)
+    keys = [f"{key}#ids#{block}" for block in blocks]
+    total, ids = 0, []
+    for block, block_key, cached in zip(blocks, keys, cache.get_many(*keys)):
+        if cached is None:
+            cached = find(block * BLOCK_SIZE, BLOCK_SIZE)
+            cache.set(block_key, cached, timeout=SEARCH_TIMEOUT)
+        total, block_ids = cached
+        ids.extend(block_ids)
+        if len(block_ids) < BLOCK_SIZE:
+            break
+    start = offset - first * BLOCK_SIZE
+    return total, ids[start : start + limit]
+
+
+def _page_key(key: str, page: int, per_page: int, variant: str) -> str:
+    return f"{key}#{page}#{per_page}#{variant}"
+
+
+def get_page(key: str, page: int, per_page: int, variant: str = ""):
+    """Rendered page of a search; `variant` tells apart projections of it."""
+    return cache.get(_page_key(key, page, per_page, variant))
+
+
+def set_page(key: str, page: int, per_page: int, payload, variant: str = ""):
+    cache.set(_page_key(key, page, per_page, variant), payload, timeout=SEARCH_TIMEOUT)
+
+
+@on_change
+def _invalidate(changes):
+    genres = {
+        genre
+        for change in changes
+        for movie in (change.before, change.after)
+        if movie is not None
+        for genre in movie["genres"]
+    }
+    keys = [CATALOG_GENERATION_KEY, *_generation_keys(sorted(genres))]
+    for key, generation in zip(keys, cache.get_many(*keys)):
+        # A missing counter is seeded past every entry keyed on it
+        if generation is not None:
+            # Atomic INCR on Redis
+            cache.cache.inc(key)
@@ -0,0 +1,101 @@
+"""Serving mode: skip work that only the CLI and the docs need.
+
+In serving processes (APP_MODE=serve) the OpenAPI document is not generated
+from the schemas while blueprints are registered. It is built once at image
+build time with `flask openapi write openapi.json` and served as a file.
+
+With PRELOAD, the catalog structures are built once in the gunicorn master
+and inherited by the forked workers (see gunicorn.conf.py). They are frozen
+out of the garbage collector so collections in the workers do not write to,
+and thereby copy, the pages they live in. Workers keep them current by
+catching up on the change feed rather than rebuilding them.
+"""
+import gc
+import os
+
+from apispec.ext.marshmallow import MarshmallowPlugin
+from flask import abort, send_file
+from flask_smorest import Api
+
+import suggest
+from cache import cache
+from db import db
+from ratelimit import limiter
+
+
+# Apps built by `preload`, reset in each worker by `post_fork`
+_preloaded = []
+
+
+class _UnresolvedSchemas(MarshmallowPlugin):
+    """Marshmallow plugin that leaves the schemas of operations unconverted."""
+
+    def operation_helper(self, path=None, operations=None, **kwargs) -> None:
+        pass
+
+
+class ServingApi(Api):
+    """Api that registers blueprints without converting their schemas.
+
+    Converting the schemas of every operation to OpenAPI is most of the cost
+    of registering blueprints; the document it builds is never served here.
+    """
+
+    def __init__(self, app=None, *, spec_kwargs=None, **kwargs):
+        spec_kwargs = {
+            "marshmallow_plugin": _UnresolvedSchemas(),
+            **(spec_kwargs or {}),
+        }
+        super().__init__(app, spec_kwargs=spec_kwargs, **kwargs)
+
+
+def register_static_spec(app, url: str, path: str) -> None:
+    """Serve the prebuilt OpenAPI document at `url`."""
+    path = os.path.abspath(path)
+
+    def openapi_json():
+        if not os.path.exists(path):
+            abort(404)
+        return send_file(path, mimetype="application/json", max_age=3600)
+
+    app.add_url_rule(url, endpoint="openapi_json", view_func=openapi_json)
+
+
+def preload(app) -> None:
+    """Build the shared catalog structures of `app` before workers fork."""
+    with app.app_context():
+        suggest.ensure_built(app.config["SUGGEST_MAX_AGE"])
+        if app.config["SEARCH_READ_MODEL"]:
+            import readmodel
+
+            model = readmodel.ensure_built(app.config["READ_MODEL_MAX_AGE"])
+            if app.config["READ_MODEL_DIR"]:
+                model.share(app.config["READ_MODEL_DIR"])
+        db.session.remove()
+        # Workers must not inherit connections of the master
+        for engine in db.engines.values():
+            engine.dispose()
+    _preloaded.append(app)
+    gc.freeze()
+
+
+def _redis_clients(app) -> list:
+    backend = app.extensions.get("cache", {}).get(cache)
+    clients = [
+        getattr(backend, "_write_client", None),
+        getattr(backend, "_read_client", None),
+        getattr(limiter.buckets, "client", None),
+    ]
+    return [client for client in clients if hasattr(client, "connection_pool")]
+
+
+def post_fork() -> None:
+    """Drop connections inherited from the master; call first in each worker."""
+    for app in _preloaded:
+        with app.app_context():
+            # close=False leaves the master's sockets alone
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+        for client in _redis_clients(app):
+            client.connection_pool.reset()
+    gc.enable()
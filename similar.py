@@ -0,0 +1,294 @@
+"""Precomputed similar movies.
+
+Movies are compared on two sparse binary vectors, their genres and the users
+who favourited them:
+
+    similarity = GENRE_WEIGHT * cos(genres) + FAVOURITE_WEIGHT * cos(favourites)
+
+`build` finds the `top_k` most similar live movies of every live movie and
+replaces the movie_similar table with them; the API only looks rows up. The
+neighbours are computed outside of any transaction, then swapped in with
+one short one, so readers and writers are not blocked during the build.
+
+The job never compares all pairs of movies. Movies with the same genres have
+the same genre vector, so genre similarities are computed between distinct
+genre sets, and the best genre-only neighbours of each set are ranked once.
+Co-favourites come from walking movie -> users -> movies over the favourites
+with NumPy, a batch of movies at a time. The candidates of a movie are its
+co-favourited movies and the best genre-only neighbours of its genre set:
+every other movie scores at most as high as those (ties go to the more
+popular movie), so the top k is exact. Batches are spread over a process
+pool.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from db import db, favorites_association, movie_genre_association
+from models import MovieModel, MovieSimilarModel
+
+
+GENRE_WEIGHT = 0.3
+FAVOURITE_WEIGHT = 0.7
+# Users with more favourites say little about any pair of them, and would
+# make the co-favourite walk quadratic
+MAX_USER_FAVOURITES = 1000
+
+# Arrays of the catalog, set in each worker of the pool
+_state = None
+
+
+def _group(keys, values, size: int):
+    """CSR grouping: the values of key k are values[indptr[k]:indptr[k + 1]].
+
+    Values keep their order within a group.
+    """
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=indptr[1:])
+    return indptr, values[np.argsort(keys, kind="stable")]
+
+
+def _gather(indptr, values, keys):
+    """Concatenated groups of `keys`, and the position in `keys` of each item."""
+    starts = indptr[keys]
+    counts = indptr[keys + 1] - starts
+    owner = np.repeat(np.arange(len(keys)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return values[starts[owner] + offsets], owner
+
+
+def _pairs(table, column: str, ids):
+    """(row of the movie in `ids`, other column) pairs of an association table.
+
+    Pairs of movies that are not live are dropped, and so are duplicates.
+    """
+    pairs = db.session.execute(
+        db.select(table.c.movie_id, table.c[column]).distinct()
+    ).all()
+    movie_ids = np.array([pair[0] for pair in pairs], dtype=np.int64)
+    others = np.array([pair[1] for pair in pairs], dtype=np.int64)
+    rows = np.minimum(np.searchsorted(ids, movie_ids), len(ids) - 1)
+    live = ids[rows] == movie_ids
+    return rows[live], others[live]
+
+
+def _genre_sets(ids) -> dict:
+    n = len(ids)
+    rows, genre_ids = _pairs(movie_genre_association, "genre_id", ids)
+    indptr, genre_ids = _group(rows, genre_ids, n)
+
+    set_of = np.empty(n, dtype=np.int64)
+    sets = {}
+    for row in range(n):
+        key = tuple(sorted(genre_ids[indptr[row] : indptr[row + 1]].tolist()))
+        set_of[row] = sets.setdefault(key, len(sets))
+
+    columns = {genre: i for i, genre in enumerate(np.unique(genre_ids).tolist())}
+    members = np.zeros((len(sets), len(columns)), dtype=np.float32)
+    for key, index in sets.items():
+        members[index, [columns[genre] for genre in key]] = 1
+    sizes = members.sum(axis=1)
+    norms = np.sqrt(np.outer(sizes, sizes))
+    set_similarity = np.divide(
+        members @ members.T, norms, out=np.zeros_like(norms), where=norms > 0
+    )
+    return {"set_of": set_of, "set_similarity": set_similarity}
+
+
+def _genre_candidates(state: dict, top_k: int):
+    """Best `top_k + 1` genre-only neighbours of each genre set (-1 padded).
+
+    One more than `top_k`, as a movie is among the neighbours of its own set.
+    """
+    ids, popularity = state["ids"], state["popularity"]
+    set_of, set_similarity = state["set_of"], state["set_similarity"]
+    wanted = top_k + 1
+    # Rows of each set, most popular first
+    by_popularity = np.lexsort((ids, -popularity))
+    indptr, set_rows = _group(
+        set_of[by_popularity], by_popularity, len(set_similarity)
+    )
+
+    candidates = np.full((len(set_similarity), wanted), -1, dtype=np.int64)
+    for index, similarities in enumerate(set_similarity):
+        taken, count, last = [], 0, None
+        for other in np.argsort(-similarities, kind="stable"):
+            similarity = similarities[other]
+            # Keep taking sets tied with the last one taken
+            if similarity <= 0 or (count >= wanted and similarity < last):
+                break
+            rows = set_rows[indptr[other] : indptr[other + 1]][:wanted]
+            taken.append(rows)
+            count += len(rows)
+            last = similarity
+        if not taken:
+            continue
+        rows = np.concatenate(taken)
+        order = np.lexsort(
+            (ids[rows], -popularity[rows], -set_similarity[index, set_of[rows]])
+        )
+        rows = rows[order][:wanted]
+        candidates[index, : len(rows)] = rows
+    return candidates
+
+
+def _favourites(ids) -> dict:
+    n = len(ids)
+    rows, user_ids = _pairs(favorites_association, "user_id", ids)
+    users, user_ids = np.unique(user_ids, return_inverse=True)
+    counts = np.bincount(user_ids, minlength=len(users))
+    kept = counts[user_ids] <= MAX_USER_FAVOURITES
+    rows, user_ids = rows[kept], user_ids[kept]
+    return {
+        "movie_users": _group(rows, user_ids, n),
+        "user_movies": _group(user_ids, rows, len(users)),
+    }
+
+
+def _load(top_k: int) -> dict:
+    movies = db.session.execute(
+        db.select(MovieModel.id, MovieModel._99popularity)
+        .where(MovieModel.deleted_at.is_(None))
+        .order_by(MovieModel.id)
+    ).all()
+    state = {
+        "top_k": top_k,
+        "ids": np.array([movie[0] for movie in movies], dtype=np.int64),
+        "popularity": np.array([movie[1] for movie in movies], dtype=np.float64),
+    }
+    if not movies:
+        return state
+    state.update(_genre_sets(state["ids"]))
+    state.update(_favourites(state["ids"]))
+    state["genre_candidates"] = _genre_candidates(state, top_k)
+    return state
+
+
+def _init(state: dict) -> None:
+    global _state
+    _state = state
+
+
+def _top_k(bounds) -> list:
+    """Neighbours of the movies in rows [lo, hi) of the catalog.
+
+    Returns:
+        list: (movie id, similar ids, scores) of each movie with neighbours
+    """
+    lo, hi = bounds
+    state = _state
+    ids, popularity = state["ids"], state["popularity"]
+    set_of, set_similarity = state["set_of"], state["set_similarity"]
+    n, top_k = len(ids), state["top_k"]
+
+    # Co-favourites: movie -> users -> movies
+    movie_ptr, movie_users = state["movie_users"]
+    user_ptr, user_movies = state["user_movies"]
+    favourites = np.diff(movie_ptr)
+    pair_rows = np.repeat(np.arange(lo, hi), favourites[lo:hi])
+    pair_users = movie_users[movie_ptr[lo] : movie_ptr[hi]]
+    others, owner = _gather(user_ptr, user_movies, pair_users)
+    rows = pair_rows[owner]
+    distinct = others != rows
+    pairs, shared = np.unique(
+        (rows[distinct] - lo) * n + others[distinct], return_counts=True
+    )
+    rows, others = lo + pairs // n, pairs % n
+    scores = FAVOURITE_WEIGHT * shared / np.sqrt(favourites[rows] * favourites[others])
+    scores += GENRE_WEIGHT * set_similarity[set_of[rows], set_of[others]]
+
+    # Genre-only neighbours
+    candidates = state["genre_candidates"][set_of[lo:hi]]
+    genre_rows = np.repeat(np.arange(lo, hi), candidates.shape[1])
+    genre_others = candidates.ravel()
+    valid = (genre_others >= 0) & (genre_others != genre_rows)
+    genre_rows, genre_others = genre_rows[valid], genre_others[valid]
+    genre_scores = GENRE_WEIGHT * set_similarity[
+        set_of[genre_rows], set_of[genre_others]
+    ]
+
+    rows = np.concatenate((rows, genre_rows))
+    others = np.concatenate((others, genre_others))
+    scores = np.concatenate((scores, genre_scores))
+
+    # A co-favourited movie can also be a genre neighbour: keep its best score
+    order = np.lexsort((-scores, others, rows))
+    rows, others, scores = rows[order], others[order], scores[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (others[1:] != others[:-1])
+    rows, others, scores = rows[first], others[first], scores[first]
+
+    # Most similar first, then most popular; keep the first top_k of each movie
+    order = np.lexsort((ids[others], -popularity[others], -scores, rows))
+    rows, others, scores = rows[order], others[order], scores[order]
+    positions = np.arange(len(rows))
+    starts = np.ones(len(rows), dtype=bool)
+    starts[1:] = rows[1:] != rows[:-1]
+    rank = positions - np.maximum.accumulate(np.where(starts, positions, 0))
+    kept = rank < top_k
+    rows, others, scores = rows[kept], others[kept], scores[kept]
+
+    splits = np.flatnonzero(np.diff(rows)) + 1
+    return [
+        (
+            int(ids[movie_rows[0]]),
+            ids[similar_rows].tolist(),
+            np.round(similar_scores, 4).tolist(),
+        )
+        for movie_rows, similar_rows, similar_scores in zip(
+            np.split(rows, splits), np.split(others, splits), np.split(scores, splits)
+        )
+        if len(movie_rows)
+    ]
+
+
+def _results(state: dict, batch_size: int, workers: int):
+    n = len(state["ids"])
+    bounds = [(lo, min(lo + batch_size, n)) for lo in range(0, n, batch_size)]
+    if workers == 1 or len(bounds) <= 1:
+        _init(state)
+        yield from map(_top_k, bounds)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init, initargs=(state,)) as pool:
+        yield from pool.map(_top_k, bounds)
+
+
+def build(top_k: int = 20, batch_size: int = 1000, workers: int = 0) -> dict:
+    """Recompute the similar movies of every live movie and commit them.
+
+    The previous neighbours are replaced in a single transaction, once all
+    the new ones are computed.
+
+    Args:
+        top_k (int): Neighbours kept per movie
+        batch_size (int): Movies per task of the pool
+        workers (int): Processes to use; defaults to the number of CPUs
+
+    Returns:
+        dict: Number of live movies and of movies with neighbours
+    """
+    state = _load(top_k)
+    # End the read transaction before the long computation
+    db.session.commit()
+    workers = workers or os.cpu_count() or 1
+    now = datetime.utcnow()
+    rows = [
+        {
+            "movie_id": movie_id,
+            "similar_ids": similar_ids,
+            "scores": scores,
+            "built_at": now,
+        }
+        for results in _results(state, batch_size, workers)
+        for movie_id, similar_ids, scores in results
+    ]
+
+    db.session.execute(db.delete(MovieSimilarModel))
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(
+            MovieSimilarModel.__table__.insert(), rows[start : start + batch_size]
+        )
+    db.session.commit()
+    return {"movies": len(state["ids"]), "written": len(rows)}
@@ -0,0 +1,135 @@
+"""Binary snapshot of the movie catalog, loaded with mmap.
+
+Layout (all integers little-endian):
+
+- 8 bytes magic, 8 bytes header length, then a JSON header with the change
+  feed sequence number the snapshot is current to, the row count, the genre
+  names in bit order and the offset and dtype of every section;
+- fixed-width columns, one row per movie sorted by id: ids, score,
+  popularity, genres (bitmask), live, and order (rows sorted by popularity).
+
+Names and directors are not stored: searches filtering on them go to the
+database, and results are loaded from it by id.
+
+Sections start on 64-byte boundaries so they map straight into NumPy arrays
+without copying. The file is mapped copy-on-write: processes opening the
+same snapshot share its pages until one of them writes to a row.
+"""
+import json
+import mmap
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+
+MAGIC = b"MOVSNAP1"
+FORMAT_VERSION = 1
+ALIGN = 64
+
+COLUMN_DTYPES = {
+    "ids": "<i8",
+    "score": "<f8",
+    "popularity": "<f8",
+    "genres": "<u8",
+    "live": "|b1",
+    "order": "<i8",
+}
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _padding(size: int) -> bytes:
+    return b"\0" * (-size % ALIGN)
+
+
+def write(path: str, seq: int, columns: dict, genres: list) -> int:
+    """Write a snapshot atomically.
+
+    Args:
+        path (str): Destination; replaced once the new file is complete
+        seq (int): Last change feed sequence number reflected in the data
+        columns (dict): Arrays named as in COLUMN_DTYPES, rows sorted by id
+        genres (list): Genre names in bit order
+
+    Returns:
+        int: Size of the snapshot in bytes
+    """
+    sections = [
+        (name, np.ascontiguousarray(columns[name], dtype))
+        for name, dtype in COLUMN_DTYPES.items()
+    ]
+
+    # Offsets are relative to the end of the header
+    position = 0
+    directory = {}
+    for name, array in sections:
+        directory[name] = {
+            "offset": position,
+            "dtype": array.dtype.str,
+            "length": len(array),
+        }
+        position += array.nbytes + len(_padding(array.nbytes))
+
+    header = json.dumps(
+        {
+            "format": FORMAT_VERSION,
+            "seq": seq,
+            "count": len(columns["ids"]),
+            "created": datetime.utcnow().isoformat(),
+            "genres": genres,
+            "sections": directory,
+        }
+    ).encode()
+    header += _padding(len(MAGIC) + 8 + len(header))
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for _, array in sections:
+            f.write(array.tobytes())
+            f.write(_padding(array.nbytes))
+        size = f.tell()
+    # Processes that mapped the old file keep reading it until they reopen
+    os.replace(tmp, path)
+    return size
+
+
+class CatalogSnapshot:
+    """Read-only (copy-on-write) view of a snapshot file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        if self._map[: len(MAGIC)] != MAGIC:
+            raise SnapshotError(f"{path} is not a catalog snapshot")
+        (length,) = struct.unpack_from("<Q", self._map, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(bytes(self._map[start : start + length]).rstrip(b"\0"))
+        if header["format"] != FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format {header['format']}")
+
+        self.seq = header["seq"]
+        self.count = header["count"]
+        self.created = header["created"]
+        self.genres = header["genres"]
+        sections = header["sections"]
+        # Files written before the string tables were dropped still have them
+        self.columns = {
+            name: np.frombuffer(
+                self._map,
+                dtype=sections[name]["dtype"],
+                count=sections[name]["length"],
+                offset=start + length + sections[name]["offset"],
+            )
+            for name in COLUMN_DTYPES
+        }
+
+    def row(self, id: int):
+        """Row of a movie id, or None."""
+        ids = self.columns["ids"]
+        row = int(np.searchsorted(ids, id))
+        return row if row < self.count and ids[row] == id else None
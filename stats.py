@@ -0,0 +1,264 @@
+"""Rollups of movie scores behind the /stats endpoints.
+
+stats_rollup keeps the count, sum and sum of squares of the imdb_score of the
+live movies of each dimension key: the whole catalog, each genre and each
+director. stats_histogram keeps their counts per score bucket. Reads are
+lookups of these rows and never touch the movie table.
+
+The rollups are updated in the transaction of every movie write, from the
+before/after snapshots of its changes, with atomic increments (INSERT ... ON
+CONFLICT DO UPDATE), so concurrent writers never lose an update. Bulk loads
+report their inserts the same way. `rebuild` recomputes them from the movie
+table, from `flask catalog rebuild-stats`.
+
+Every write increments the ("catalog", "") row, so writers queue on its row
+lock until they commit. They already queue on the lock of the change feed
+(see changelog), taken in the same transactions, so the hot row adds no
+serialization of its own. Splitting it into per-transaction delta rows would
+only pay off with the change feed lock gone.
+"""
+import math
+from collections import Counter, defaultdict
+
+from db import db, movie_genre_association
+from events import on_reset, on_transaction
+from models import GenreModel, MovieModel, ScoreHistogramModel, StatsRollupModel
+from upsert import UPSERT_INSERTS
+
+
+CATALOG = "catalog"
+GENRE = "genre"
+DIRECTOR = "director"
+# Unit-wide imdb_score buckets; a 10 falls in the last one
+BUCKETS = 10
+
+
+def bucket(score: float) -> int:
+    return min(max(int(score), 0), BUCKETS - 1)
+
+
+def _keys(movie: dict):
+    yield CATALOG, ""
+    yield DIRECTOR, movie["director"]
+    for genre in movie["genres"]:
+        yield GENRE, genre
+
+
+def _deltas(changes) -> tuple:
+    rollups = defaultdict(lambda: [0, 0.0, 0.0])
+    histogram = Counter()
+    for change in changes:
+        for movie, sign in ((change.before, -1), (change.after, 1)):
+            if movie is None:
+                continue
+            score = movie["imdb_score"]
+            for key in _keys(movie):
+                rollup = rollups[key]
+                rollup[0] += sign
+                rollup[1] += sign * score
+                rollup[2] += sign * score * score
+                histogram[key + (bucket(score),)] += sign
+    # Sorted, so concurrent writers lock the rows in the same order
+    return (
+        [
+            {
+                "dimension": dimension,
+                "key": key,
+                "count": count,
+                "score_sum": score_sum,
+                "score_squares": score_squares,
+            }
+            for (dimension, key), (count, score_sum, score_squares) in sorted(
+                rollups.items()
+            )
+            if count or score_sum or score_squares
+        ],
+        [
+            {"dimension": dimension, "key": key, "bucket": bucket, "count": count}
+            for (dimension, key, bucket), count in sorted(histogram.items())
+            if count
+        ],
+    )
+
+
+def _increment(session, model, rows: list) -> None:
+    """Add the counters of `rows` to the rows of `model` with the same key."""
+    table = model.__table__
+    keys = [column.name for column in table.primary_key]
+    counters = [name for name in rows[0] if name not in keys]
+    dialect = session.get_bind().dialect.name
+    if dialect in UPSERT_INSERTS:
+        insert = UPSERT_INSERTS[dialect](table)
+        statement = insert.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + insert.excluded[name] for name in counters},
+        )
+        session.execute(statement, rows)
+        return
+    for row in rows:
+        updated = session.execute(
+            table.update()
+            .where(*(table.c[name] == row[name] for name in keys))
+            .values({name: table.c[name] + row[name] for name in counters})
+        )
+        if not updated.rowcount:
+            session.execute(table.insert(), [row])
+
+
+@on_transaction
+def _update(session, changes):
+    if not changes:
+        return
+    rollups, histogram = _deltas(changes)
+    if rollups:
+        _increment(session, StatsRollupModel, rollups)
+    if histogram:
+        _increment(session, ScoreHistogramModel, histogram)
+
+
+def _select(dimension: str, *columns, group_by=()):
+    """SELECT of the dimension, its key and `columns` over live movies."""
+    if dimension == GENRE:
+        key = GenreModel.name
+    elif dimension == DIRECTOR:
+        key = MovieModel.director
+    else:
+        # A single group: deleted_at is NULL for every live movie, and an
+        # empty catalog yields no row
+        key = db.literal("")
+        group_by = (MovieModel.deleted_at, *group_by)
+    query = db.select(db.literal(dimension), key, *columns).select_from(MovieModel)
+    if dimension == GENRE:
+        query = query.join(
+            movie_genre_association,
+            movie_genre_association.c.movie_id == MovieModel.id,
+        ).join(GenreModel, GenreModel.id == movie_genre_association.c.genre_id)
+    if dimension != CATALOG:
+        group_by = (key, *group_by)
+    return query.where(MovieModel.deleted_at.is_(None)).group_by(*group_by)
+
+
+def rebuild() -> None:
+    """Recompute every rollup from the movie table and commit."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        # Writers committing during the rebuild wait and increment after it
+        db.session.execute(
+            db.text("LOCK TABLE stats_rollup, stats_histogram IN EXCLUSIVE MODE")
+        )
+    db.session.execute(db.delete(StatsRollupModel))
+    db.session.execute(db.delete(ScoreHistogramModel))
+
+    score = MovieModel.imdb_score
+    # Scores are single precision on PostgreSQL: sum the decimal values
+    # writers see, not their binary approximations
+    exact_score = db.cast(score, db.Numeric)
+    # Inlined numbers, so the GROUP BY expression matches the selected one
+    score_bucket = db.case(
+        *(
+            (score < db.literal_column(str(i + 1)), db.literal_column(str(i)))
+            for i in range(BUCKETS - 1)
+        ),
+        else_=db.literal_column(str(BUCKETS - 1)),
+    )
+    rollups = StatsRollupModel.__table__
+    histogram = ScoreHistogramModel.__table__
+    for dimension in (CATALOG, GENRE, DIRECTOR):
+        db.session.execute(
+            rollups.insert().from_select(
+                ["dimension", "key", "count", "score_sum", "score_squares"],
+                _select(
+                    dimension,
+                    db.func.count(),
+                    db.func.sum(exact_score),
+                    db.func.sum(exact_score * exact_score),
+                ),
+            )
+        )
+        db.session.execute(
+            histogram.insert().from_select(
+                ["dimension", "key", "bucket", "count"],
+                _select(
+                    dimension, score_bucket, db.func.count(), group_by=(score_bucket,)
+                ),
+            )
+        )
+    db.session.commit()
+
+
+@on_reset
+def _clear_after_reset():
+    # A reset means the catalog was cleared; loads record their inserts
+    db.session.execute(db.delete(StatsRollupModel))
+    db.session.execute(db.delete(ScoreHistogramModel))
+    db.session.commit()
+
+
+def _summaries(dimension: str, rollups: list) -> list:
+    histograms = {rollup.key: [0] * BUCKETS for rollup in rollups}
+    if histograms:
+        rows = db.session.execute(
+            db.select(
+                ScoreHistogramModel.key,
+                ScoreHistogramModel.bucket,
+                ScoreHistogramModel.count,
+            ).where(
+                ScoreHistogramModel.dimension == dimension,
+                ScoreHistogramModel.key.in_(list(histograms)),
+            )
+        )
+        for key, score_bucket, count in rows:
+            histograms[key][score_bucket] = count
+
+    summaries = []
+    for rollup in rollups:
+        mean = rollup.score_sum / rollup.count
+        # Incremental sums drift a little; never report a negative variance
+        variance = max(rollup.score_squares / rollup.count - mean * mean, 0.0)
+        summaries.append(
+            {
+                "name": rollup.key if dimension != CATALOG else None,
+                "count": rollup.count,
+                "mean_score": round(mean, 4),
+                "stddev_score": round(math.sqrt(variance), 4),
+                "histogram": histograms[rollup.key],
+            }
+        )
+    return summaries
+
+
+def _rollups(dimension: str):
+    return StatsRollupModel.query.filter(
+        StatsRollupModel.dimension == dimension, StatsRollupModel.count > 0
+    )
+
+
+def summary(dimension: str, key: str = ""):
+    """Score summary of one key of a dimension, or None if it has no movies.
+
+    Returns:
+        dict: name, count, mean_score, stddev_score and histogram (movies per
+            unit-wide score bucket)
+    """
+    rollup = _rollups(dimension).filter(StatsRollupModel.key == key).first()
+    return _summaries(dimension, [rollup])[0] if rollup else None
+
+
+def summaries(dimension: str, offset: int = 0, limit=None, by_count=False):
+    """Score summaries of the keys of a dimension, and their number.
+
+    Args:
+        by_count (bool): Order by number of movies (descending) instead of name
+
+    Returns:
+        tuple: Total number of keys and up to `limit` summaries from `offset`
+    """
+    query = _rollups(dimension)
+    order = [StatsRollupModel.key]
+    if by_count:
+        order.insert(0, StatsRollupModel.count.desc())
+    rollups = query.order_by(*order).offset(offset).limit(limit).all()
+    if offset == 0 and (limit is None or len(rollups) < limit):
+        total = len(rollups)
+    else:
+        total = query.count()
+    return total, _summaries(dimension, rollups)
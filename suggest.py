@@ -0,0 +1,220 @@
+"""In-memory typeahead index over movie titles.
+
+Titles are normalized and kept in a sorted array, so the titles starting with
+a prefix are a contiguous slice found with two bisects. Narrow slices are
+ranked on the fly; the ranking of wide slices (short prefixes) is memoized
+and dropped when a title under that prefix changes.
+
+Like the read model, the index remembers the change feed position it
+reflects and catches up on the feed instead of scanning the catalog again.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from array import array
+
+import changelog
+from db import db
+from events import ARCHIVE, DELETE, on_commit, on_reset
+from models import MovieModel
+
+
+MAX_SUGGESTIONS = 50
+# Slices wider than this get their ranking memoized
+SCAN_LIMIT = 1000
+# Change feed entries read per query when catching up
+CATCH_UP_BATCH = 5000
+
+_non_word = re.compile(r"[^\w]+")
+
+
+def normalize(title: str) -> str:
+    """Lower-case, strip accents and punctuation, collapse whitespace."""
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(ch for ch in title if not unicodedata.combining(ch))
+    return _non_word.sub(" ", title.lower()).strip()
+
+
+class TitleIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        """Drop all titles. The index is rebuilt on next use."""
+        with self._lock:
+            # Parallel arrays sorted by normalized title
+            self._keys = []
+            self._ids = array("q")
+            self._popularity = array("d")
+            # id -> (normalized title, display title)
+            self._titles = {}
+            # prefix -> ids of the most popular titles under it
+            self._ranked = {}
+            self.seq = None  # last change feed entry reflected
+            self.built_at = None
+
+    def build(self, rows, seq=None) -> None:
+        """Replace the index contents.
+
+        Args:
+            rows: Iterable of (id, name, popularity)
+            seq: Change feed position the rows reflect
+        """
+        entries = sorted((normalize(name), id, name, pop) for id, name, pop in rows)
+        with self._lock:
+            self._keys = [entry[0] for entry in entries]
+            self._ids = array("q", (entry[1] for entry in entries))
+            self._popularity = array("d", (entry[3] for entry in entries))
+            self._titles = {entry[1]: (entry[0], entry[2]) for entry in entries}
+            self._ranked = {}
+            self.seq = seq
+            self.built_at = time.monotonic()
+
+    def upsert(self, id: int, name: str, popularity: float) -> None:
+        with self._lock:
+            self._remove(id)
+            key = normalize(name)
+            pos = bisect.bisect_right(self._keys, key)
+            self._keys.insert(pos, key)
+            self._ids.insert(pos, id)
+            self._popularity.insert(pos, popularity)
+            self._titles[id] = (key, name)
+            self._forget_prefixes(key)
+
+    def remove(self, id: int) -> None:
+        with self._lock:
+            self._remove(id)
+
+    def _remove(self, id: int) -> None:
+        if id not in self._titles:
+            return
+        key, _ = self._titles.pop(id)
+        pos = bisect.bisect_left(self._keys, key)
+        while self._ids[pos] != id:
+            pos += 1
+        del self._keys[pos]
+        del self._ids[pos]
+        del self._popularity[pos]
+        self._forget_prefixes(key)
+
+    def _forget_prefixes(self, key: str) -> None:
+        for end in range(len(key) + 1):
+            self._ranked.pop(key[:end], None)
+
+    def suggest(self, prefix: str, limit: int = 10) -> list:
+        """Most popular titles starting with `prefix`.
+
+        Returns:
+            list: Dicts with id, name and _99popularity, most popular first
+        """
+        prefix = normalize(prefix)
+        limit = min(limit, MAX_SUGGESTIONS)
+        if not prefix or limit < 1:
+            return []
+
+        with self._lock:
+            lo = bisect.bisect_left(self._keys, prefix)
+            hi = bisect.bisect_left(self._keys, prefix + "\U0010ffff", lo)
+            if hi - lo <= SCAN_LIMIT:
+                ranked = self._rank(lo, hi, limit)
+            else:
+                if prefix not in self._ranked:
+                    self._ranked[prefix] = self._rank(lo, hi, MAX_SUGGESTIONS)
+                ranked = self._ranked[prefix][:limit]
+
+            return [
+                {
+                    "id": id,
+                    "name": self._titles[id][1],
+                    "_99popularity": popularity,
+                }
+                for id, popularity in ranked
+            ]
+
+    def _rank(self, lo: int, hi: int, limit: int) -> list:
+        best = heapq.nlargest(limit, range(lo, hi), key=self._popularity.__getitem__)
+        return [(self._ids[pos], self._popularity[pos]) for pos in best]
+
+
+title_index = TitleIndex()
+
+
+# Held by the request refreshing the index
+_refresh_lock = threading.Lock()
+
+
+def _rebuild() -> None:
+    # Read the position first: changes committing during the scan are applied
+    # again by the next catch up, which leaves titles as they are
+    seq = changelog.last_seq()
+    title_index.build(
+        db.session.execute(
+            db.select(MovieModel.id, MovieModel.name, MovieModel._99popularity).where(
+                MovieModel.deleted_at.is_(None)
+            )
+        ),
+        seq,
+    )
+
+
+def catch_up() -> None:
+    """Apply the change feed entries recorded since the index was built."""
+    while title_index.seq is not None:
+        entries = changelog.changes_since(title_index.seq, CATCH_UP_BATCH)
+        for entry in entries:
+            if entry.op == changelog.RESET:
+                _rebuild()
+                return
+            if entry.entity == "movie":
+                if entry.op in (DELETE, ARCHIVE):
+                    title_index.remove(int(entry.key))
+                else:
+                    movie = entry.payload
+                    title_index.upsert(
+                        movie["id"], movie["name"], movie["_99popularity"]
+                    )
+            title_index.seq = entry.seq
+        if len(entries) < CATCH_UP_BATCH:
+            title_index.built_at = time.monotonic()
+            return
+    _rebuild()
+
+
+def ensure_built(max_age: float) -> TitleIndex:
+    """Build the index if it is empty, catch up if older than `max_age` seconds.
+
+    Writes made through this process are applied as they commit; catching up
+    on the change feed picks up writes served by other workers. One request
+    at a time refreshes a built index, the others keep serving it meanwhile.
+    """
+    built_at = title_index.built_at
+    if built_at is None:
+        with _refresh_lock:
+            if title_index.built_at is None:
+                _rebuild()
+    elif time.monotonic() - built_at > max_age and _refresh_lock.acquire(False):
+        try:
+            catch_up()
+        finally:
+            _refresh_lock.release()
+    return title_index
+
+
+@on_commit
+def _apply_changes(changes):
+    if title_index.built_at is None:
+        return
+    for change in changes:
+        # Deleted or archived
+        if change.after is None:
+            title_index.remove(change.id)
+        else:
+            movie = change.after
+            title_index.upsert(movie["id"], movie["name"], movie["_99popularity"])
+
+
+on_reset(title_index.clear)
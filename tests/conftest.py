@@ -0,0 +1,40 @@
+import pytest
+
+from db import db
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Factory of apps on a fresh SQLite database, configured through `env`."""
+
+    def make(**env):
+        settings = {
+            "DB_URL": f"sqlite:///{tmp_path / 'movies.db'}",
+            "CACHE_TYPE": "SimpleCache",
+            "RATELIMIT_STORAGE": "memory",
+            "RATELIMIT_ENABLED": "1",
+            "PRELOAD": "0",
+            "JWT_SECRET_KEY": "test-secret-that-is-long-enough-for-hs256",
+            **env,
+        }
+        for key, value in settings.items():
+            monkeypatch.setenv(key, value)
+
+        from app import create_app
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+        return app
+
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
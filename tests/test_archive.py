@@ -0,0 +1,76 @@
+import archive
+from db import db
+from models import MovieModel
+
+
+def add_movie(app, name="Alien", popularity=10.0):
+    with app.app_context():
+        movie = MovieModel(
+            name=name, director="Ridley Scott", imdb_score=8.5, _99popularity=popularity
+        )
+        db.session.add(movie)
+        db.session.commit()
+        return movie.id
+
+
+def test_archived_movie_is_served_with_a_new_etag(app, client):
+    id = add_movie(app)
+    live = client.get(f"/movies/{id}")
+    assert live.get_json().get("archived") is not True
+
+    with app.app_context():
+        assert archive.archive(below_popularity=50) == 1
+
+    response = client.get(
+        f"/movies/{id}", headers={"If-None-Match": live.headers["ETag"]}
+    )
+    assert response.status_code == 200
+    assert response.get_json()["archived"] is True
+    assert response.headers["ETag"] != live.headers["ETag"]
+    assert client.get("/movies/").get_json()["total"] == 0
+
+
+def test_feed_tells_archived_from_deleted(app, client):
+    archived = add_movie(app, "Alien")
+    deleted = add_movie(app, "Heat", popularity=90.0)
+    with app.app_context():
+        db.session.get(MovieModel, deleted).deleted_at = db.func.now()
+        db.session.commit()
+        archive.archive(below_popularity=50)
+
+    changes = client.get("/movies/changes?since=0").get_json()["changes"]
+    ops = [
+        (int(change["key"]), change["op"])
+        for change in changes
+        if change["entity"] == "movie"
+    ]
+    assert ops[-2:] == [(deleted, "delete"), (archived, "archive")]
+
+
+def test_list_stays_in_id_order_after_a_delete(app, client):
+    directors = ["Zhang Yimou", "Agnès Varda", "Martin Scorsese", "Bong Joon-ho"]
+    with app.app_context():
+        for i, director in enumerate(directors):
+            db.session.add(
+                MovieModel(
+                    name=f"Movie {i}",
+                    director=director,
+                    director_id=len(directors) - i,
+                    imdb_score=7.0,
+                    # The partial indexes on director and popularity both
+                    # order the rows differently from their ids
+                    _99popularity=10.0 - i,
+                )
+            )
+        db.session.commit()
+        db.session.get(MovieModel, 2).deleted_at = db.func.now()
+        db.session.commit()
+
+    pages = [
+        client.get(f"/movies/?page={page}&per_page=2").get_json()
+        for page in (1, 2)
+    ]
+    assert [[movie["id"] for movie in page["movies"]] for page in pages] == [
+        [1, 3],
+        [4],
+    ]
@@ -0,0 +1,59 @@
+import json
+
+import changelog
+from db import db
+from ingest import ingest
+from models import MovieModel
+
+
+def record(name, director="Someone"):
+    return {
+        "name": name,
+        "director": director,
+        "imdb_score": 7.0,
+        "99popularity": 70.0,
+        "genre": ["Drama"],
+    }
+
+
+def write_ndjson(path, lines):
+    path.write_text("".join(line + "\n" for line in lines))
+    return str(path)
+
+
+def test_rejects_report_their_position(app, tmp_path):
+    source = write_ndjson(
+        tmp_path / "movies.ndjson",
+        [
+            json.dumps(record("Alien")),
+            "{not json",
+            json.dumps(record("Alien")),
+            json.dumps(record("Heat")),
+        ],
+    )
+    rejects_path = tmp_path / "rejects.ndjson"
+    with app.app_context():
+        result = ingest([source], workers=1, rejects_path=str(rejects_path))
+    assert (result["loaded"], result["rejected"]) == (2, 2)
+
+    rejects = [json.loads(line) for line in rejects_path.read_text().splitlines()]
+    lines = open(source, "rb").read().splitlines(keepends=True)
+    offsets = [sum(len(line) for line in lines[:i]) for i in range(len(lines))]
+    assert sorted(reject["position"] for reject in rejects) == offsets[1:3]
+
+
+def test_chunks_are_recorded_in_the_change_feed_and_resumed(app, tmp_path):
+    lines = [json.dumps(record(f"Movie {i}")) for i in range(6)]
+    source = write_ndjson(tmp_path / "movies.ndjson", lines)
+    chunk_bytes = len(lines[0]) * 2 + 2
+    with app.app_context():
+        first = ingest([source], workers=1, chunk_bytes=chunk_bytes)
+        assert first["chunks"] > 1 and first["loaded"] == 6
+        entries = changelog.changes_since(0, 100)
+        movies = [entry for entry in entries if entry.entity == "movie"]
+        assert [entry.op for entry in movies] == ["insert"] * 6
+        assert changelog.RESET not in {entry.op for entry in entries}
+
+        again = ingest([source], workers=1, chunk_bytes=chunk_bytes)
+        assert again["skipped"] == again["chunks"] and again["loaded"] == 0
+        assert db.session.query(MovieModel).count() == 6
@@ -0,0 +1,116 @@
+import pytest
+
+import ratelimit
+from ratelimit import LocalBuckets, RedisBuckets, limiter, parse_rate
+
+
+class Clock:
+    """Stands in for the time module of ratelimit."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["local", "redis"])
+def buckets(request):
+    if request.param == "local":
+        return LocalBuckets()
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # Lua scripting of fakeredis
+    return RedisBuckets(fakeredis.FakeRedis())
+
+
+def test_parse_rate():
+    assert parse_rate("5/minute") == (5 / 60, 5)
+    assert parse_rate("20/second") == (20, 20)
+
+
+def test_burst_then_empty(buckets, clock):
+    assert [buckets.take("k", 1, 3) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("k", 1, 3) == pytest.approx(1)
+    # Other keys have their own bucket
+    assert buckets.take("other", 1, 3) == 0
+
+
+def test_refill(buckets, clock):
+    for _ in range(2):
+        buckets.take("k", 2, 2)
+    clock.now += 0.25
+    assert buckets.take("k", 2, 2) == pytest.approx(0.25)
+    clock.now += 0.25
+    assert buckets.take("k", 2, 2) == 0
+    assert buckets.take("k", 2, 2) == pytest.approx(0.5)
+
+
+def test_refill_stops_at_burst(buckets, clock):
+    for _ in range(3):
+        buckets.take("k", 1, 3)
+    clock.now += 3600
+    assert [buckets.take("k", 1, 3) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("k", 1, 3) > 0
+
+
+def test_local_prunes_full_buckets(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "MAX_LOCAL_BUCKETS", 2)
+    buckets = LocalBuckets()
+    for key in "abc":
+        buckets.take(key, 1, 1)
+    clock.now += 2
+    buckets.take("d", 1, 1)
+    assert set(buckets._buckets) == {"d"}
+
+
+def login(client, address="10.0.0.1"):
+    return client.post(
+        "/users/login",
+        json={"email": "nobody@example.com", "password": "secret"},
+        environ_base={"REMOTE_ADDR": address},
+    )
+
+
+@pytest.mark.parametrize("storage", ["local", "redis"])
+def test_429_with_retry_after(client, clock, storage):
+    if storage == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        limiter.buckets = RedisBuckets(fakeredis.FakeRedis())
+
+    # POST /users/login allows 10/minute
+    assert all(login(client).status_code != 429 for _ in range(10))
+    response = login(client)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "6"
+    assert login(client, "10.0.0.2").status_code != 429
+
+    clock.now += 6
+    assert login(client).status_code != 429
+
+
+def test_disabled(make_app, clock):
+    client = make_app(RATELIMIT_ENABLED="0").test_client()
+    assert all(login(client).status_code != 429 for _ in range(20))
+
+
+def test_busy_process_sheds_with_503(make_app):
+    app = make_app(MAX_CONCURRENT_REQUESTS="1", MAX_QUEUE_WAIT="0")
+    # A request in flight holds the only slot of the process
+    assert limiter._slots.acquire(blocking=False)
+    try:
+        response = app.test_client().get("/movies/1")
+    finally:
+        limiter._slots.release()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
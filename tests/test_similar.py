@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import archive  # noqa: E402
+import similar  # noqa: E402
+from db import db  # noqa: E402
+from models import GenreModel, MovieModel, MovieSimilarModel  # noqa: E402
+
+
+@pytest.fixture
+def catalog(app):
+    """Five drama movies, the first one the least popular."""
+    with app.app_context():
+        drama = GenreModel(name="Drama")
+        for i in range(5):
+            movie = MovieModel(
+                name=f"Movie {i}",
+                director="Someone",
+                imdb_score=7.0,
+                _99popularity=10.0 * (i + 1),
+            )
+            movie.genres.append(drama)
+            db.session.add(movie)
+        db.session.commit()
+        similar.build(top_k=3, workers=1)
+    return app
+
+
+def similar_ids(client, id, limit=10):
+    response = client.get(f"/movies/{id}/similar?limit={limit}")
+    return response.status_code, [movie["id"] for movie in response.get_json()]
+
+
+def test_build_replaces_neighbours(catalog):
+    with catalog.app_context():
+        assert db.session.get(MovieSimilarModel, 1).similar_ids == [5, 4, 3]
+        assert similar.build(top_k=2, workers=1) == {"movies": 5, "written": 5}
+        assert db.session.get(MovieSimilarModel, 1).similar_ids == [5, 4]
+
+
+def test_limit_applies_after_skipping_removed_neighbours(catalog):
+    client = catalog.test_client()
+    with catalog.app_context():
+        db.session.get(MovieModel, 5).deleted_at = db.func.now()
+        db.session.commit()
+    assert similar_ids(client, 1, limit=2) == (200, [4, 3])
+
+
+def test_removed_movie_is_not_found(catalog):
+    client = catalog.test_client()
+    with catalog.app_context():
+        db.session.get(MovieModel, 1).deleted_at = db.func.now()
+        db.session.commit()
+        # Archive the second one while it is live
+        archive.archive(below_popularity=25)
+    assert client.get("/movies/1/similar").status_code == 404
+    assert client.get("/movies/2/similar").status_code == 404
+    assert similar_ids(client, 3) == (200, [5, 4])
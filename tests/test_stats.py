@@ -0,0 +1,48 @@
+import stats
+from data.data import clear_data
+from db import db
+from models import GenreModel, MovieModel
+
+
+def add_movies(app):
+    with app.app_context():
+        drama = GenreModel(name="Drama")
+        for i, score in enumerate((6.0, 7.5, 9.0)):
+            movie = MovieModel(
+                name=f"Movie {i}",
+                director="Someone" if i else "Someone Else",
+                imdb_score=score,
+                _99popularity=50.0,
+            )
+            movie.genres.append(drama)
+            db.session.add(movie)
+        db.session.commit()
+
+
+def test_writes_update_rollups_like_a_rebuild(app):
+    add_movies(app)
+    with app.app_context():
+        db.session.get(MovieModel, 1).imdb_score = 8.0
+        db.session.commit()
+        incremental = stats.summaries(stats.DIRECTOR)
+        assert stats.summary(stats.CATALOG)["count"] == 3
+        assert stats.summary(stats.GENRE, "Drama")["histogram"][6:] == [0, 1, 1, 1]
+
+        stats.rebuild()
+        assert stats.summaries(stats.DIRECTOR) == incremental
+
+
+def test_by_count(app):
+    add_movies(app)
+    with app.app_context():
+        total, summaries = stats.summaries(stats.DIRECTOR, by_count=True)
+    assert total == 2
+    assert [summary["name"] for summary in summaries] == ["Someone", "Someone Else"]
+
+
+def test_clearing_the_catalog_empties_rollups(app):
+    add_movies(app)
+    with app.app_context():
+        clear_data()
+        assert stats.summary(stats.CATALOG) is None
+        assert stats.summaries(stats.GENRE) == (0, [])
@@ -0,0 +1,77 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from db import db
+from models import MovieModel
+import upsert
+
+MOVIE = {
+    "director": "Ridley Scott",
+    "imdb_score": 8.5,
+    "_99popularity": 85.0,
+    "genres": ["Horror"],
+}
+
+
+@pytest.fixture(params=["native", "fallback"])
+def put(request, app, monkeypatch):
+    if request.param == "fallback":
+        # As on a database without INSERT ... ON CONFLICT
+        monkeypatch.setattr(upsert, "UPSERT_INSERTS", {})
+    with app.app_context():
+        token = create_access_token(identity="1", additional_claims={"isAdmin": True})
+    client = app.test_client()
+
+    def put(name, body):
+        return client.put(
+            f"/movies/{name}", json=body, headers={"Authorization": f"Bearer {token}"}
+        )
+
+    return put
+
+
+def test_retry_replaces_instead_of_creating(app, put):
+    first = put("Alien", MOVIE)
+    assert first.status_code == 201
+    retry = put("Alien", MOVIE)
+    assert retry.status_code == 200
+    assert retry.get_json()["id"] == first.get_json()["id"]
+    # Nothing changed, so the version and with it the ETag stay
+    with app.app_context():
+        assert db.session.get(MovieModel, first.get_json()["id"]).version == 1
+
+
+def test_genre_change_bumps_version(app, put):
+    put("Alien", MOVIE)
+    etag = app.test_client().get("/movies/Alien").headers["ETag"]
+    put("Alien", {**MOVIE, "genres": ["Horror", "Sci-Fi"]})
+    response = app.test_client().get("/movies/Alien")
+    assert response.headers["ETag"] != etag
+    assert sorted(genre["name"] for genre in response.get_json()["genres"]) == [
+        "Horror",
+        "Sci-Fi",
+    ]
+
+
+def test_change_replaces(put):
+    put("Alien", MOVIE)
+    response = put("Alien", {**MOVIE, "imdb_score": 8.4})
+    assert response.status_code == 200
+    assert response.get_json()["imdb_score"] == 8.4
+
+
+@pytest.mark.parametrize("by", ["name", "id"])
+def test_rename_onto_existing_movie_conflicts(app, by):
+    with app.app_context():
+        token = create_access_token(identity="1", additional_claims={"isAdmin": True})
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    client.put("/movies/Alien", json=MOVIE, headers=headers)
+    other = client.put("/movies/Prometheus", json=MOVIE, headers=headers).get_json()
+
+    target = "Prometheus" if by == "name" else other["id"]
+    response = client.patch(
+        f"/movies/{target}", json={"name": "Alien", "genres": ["Drama"]}, headers=headers
+    )
+    assert response.status_code == 409
+    assert client.get(f"/movies/{other['id']}").get_json()["name"] == "Prometheus"
@@ -0,0 +1,58 @@
+"""Measure import and create_app time of the application.
+
+Each run starts a fresh interpreter, so module imports are measured cold:
+
+    python tools/bench_startup.py --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({"import": imported - start, "create_app": created - imported}))
+"""
+
+
+def run(mode: str) -> dict:
+    env = dict(os.environ, APP_MODE=mode)
+    env.setdefault("CACHE_TYPE", "SimpleCache")
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", default="full,serve")
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        timings = [run(mode) for _ in range(args.runs)]
+        imported = statistics.median(t["import"] for t in timings) * 1000
+        created = statistics.median(t["create_app"] for t in timings) * 1000
+        print(
+            f"{mode:>6}: import {imported:7.1f} ms  create_app {created:7.1f} ms  "
+            f"total {imported + created:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,737 @@
+"""Load test the API on a local stack and find its saturation point.
+
+    python tools/loadtest.py run --workers 4 --rates 50,100,200,400 --out sqlite-4w.json
+    python tools/loadtest.py run --db-url postgresql+psycopg2://... --out pg-4w.json
+    python tools/loadtest.py compare sqlite-4w.json pg-4w.json
+
+`run` boots the app under gunicorn (tools/loadtest_gunicorn.py) with a
+Redis stand-in (redis-server when installed, fakeredis otherwise) and a
+file-backed database (a fresh SQLite file unless --db-url is given), seeds
+the catalog and test accounts, then offers each rate in turn for --duration
+seconds.
+
+Arrivals are open loop: requests start on a Poisson schedule whether or not
+earlier ones have finished, and latency is measured from the scheduled
+start. A saturated server shows up as growing latency and errors, not as a
+lower request rate.
+
+Every step reports latency percentiles (overall and per operation), the
+error rate (5xx and transport errors), the hit ratio of the app cache and
+database lock waits: sampled waiting backends on PostgreSQL, the time a
+probe waits for the write lock on SQLite. The saturation point is the
+highest rate served with a p99 within --slo-ms and at most
+--max-error-rate errors. Reports are JSON; `compare` lines them up.
+"""
+import argparse
+import collections
+import http.client
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote, urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Counters added up by the workers, see tools/loadtest_gunicorn.py
+HITS_KEY = "loadtest#cache#hits"
+MISSES_KEY = "loadtest#cache#misses"
+PASSWORD = "loadtest-password"
+ADMIN_EMAIL = "admin@loadtest.local"
+DEFAULT_MIX = "get_id=40,get_name=15,search=25,favourite=8,login=2,write=10"
+GENRES = ["Drama", "Comedy", "Action", "Adventure", "Crime", "Thriller", "Family"]
+LOCK_SAMPLE_INTERVAL = 0.1
+
+
+class Histogram:
+    """Latency histogram with buckets 2% wide, from 10 µs up."""
+
+    GROWTH = 1.02
+    LOWEST = 1e-5
+
+    def __init__(self):
+        self.buckets = collections.Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        bucket = 0
+        if seconds > self.LOWEST:
+            bucket = math.ceil(math.log(seconds / self.LOWEST, self.GROWTH))
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: "Histogram") -> None:
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile, in seconds."""
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.LOWEST * self.GROWTH**bucket, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        ms = {
+            f"p{str(p).replace('.', '')}_ms": round(self.percentile(p) * 1000, 2)
+            for p in (50, 90, 99, 99.9)
+        }
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 2),
+            **ms,
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+class Recorder:
+    """Latencies and status codes per operation, shared by the client threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = collections.defaultdict(Histogram)
+        self.statuses = collections.defaultdict(collections.Counter)
+
+    def record(self, op: str, status, seconds: float) -> None:
+        with self._lock:
+            self.latency[op].record(seconds)
+            self.statuses[op][str(status)] += 1
+
+    def errors(self, op=None) -> int:
+        ops = [op] if op else list(self.statuses)
+        return sum(
+            n
+            for name in ops
+            for status, n in self.statuses[name].items()
+            if not status.isdigit() or int(status) >= 500
+        )
+
+
+class Client(threading.local):
+    """One keep-alive connection per client thread."""
+
+    def __init__(self, port: int, timeout: float):
+        self.port = port
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method: str, path: str, body=None, headers=None):
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(
+                "127.0.0.1", self.port, timeout=self.timeout
+            )
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+        return response.status, data
+
+
+class Workload:
+    """Catalog, accounts and tokens the operations draw from.
+
+    Movies are picked with a power-law skew (`skew` 1 is uniform), so a hot
+    set gets most of the reads as in production.
+    """
+
+    def __init__(self, ids, names, users, skew):
+        self.ids = ids
+        self.names = names
+        self.users = users
+        self.skew = skew
+        self.user_tokens = []
+        self.admin_token = None
+
+    def pick(self, items):
+        return items[int(len(items) * random.random() ** self.skew)]
+
+    def user_headers(self):
+        return {"Authorization": f"Bearer {random.choice(self.user_tokens)}"}
+
+    def admin_headers(self):
+        return {"Authorization": f"Bearer {self.admin_token}"}
+
+
+def op_get_id(w):
+    return "GET", f"/movies/{w.pick(w.ids)}", None, None
+
+
+def op_get_name(w):
+    return "GET", f"/movies/{quote(w.pick(w.names), safe='')}", None, None
+
+
+def op_search(w):
+    params = {"genres": random.choice(GENRES)}
+    if random.random() < 0.5:
+        params["min_rating"] = random.choice([5, 6, 7, 8])
+    params["page"] = random.choice([1, 1, 1, 2, 3])
+    return "GET", f"/movies/search?{urlencode(params)}", None, None
+
+
+def op_favourite(w):
+    index = int(len(w.ids) * random.random() ** w.skew)
+    if random.random() < 0.5:
+        return "POST", f"/movies/{w.ids[index]}/favourite", None, w.user_headers()
+    name = quote(w.names[index], safe="")
+    return "DELETE", f"/movies/{name}/favourite", None, w.user_headers()
+
+
+def op_login(w):
+    body = {"email": random.choice(w.users), "password": PASSWORD}
+    return "POST", "/users/login", body, None
+
+
+def op_write(w):
+    body = {"imdb_score": round(random.uniform(1, 10), 1)}
+    return "PATCH", f"/movies/{w.pick(w.ids)}", body, w.admin_headers()
+
+
+OPERATIONS = {
+    "get_id": op_get_id,
+    "get_name": op_get_name,
+    "search": op_search,
+    "favourite": op_favourite,
+    "login": op_login,
+    "write": op_write,
+}
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r}; use {', '.join(OPERATIONS)}")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, process, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Process exited with {process.returncode} on startup")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"Nothing listening on port {port} after {timeout}s")
+
+
+class Stack:
+    """Redis stand-in and gunicorn, stopped together."""
+
+    def __init__(self, workdir: str):
+        self.workdir = workdir
+        self.processes = []
+        self.redis_kind = None
+
+    def start_redis(self) -> int:
+        port = free_port()
+        log = open(os.path.join(self.workdir, "redis.log"), "w")
+        if shutil.which("redis-server"):
+            self.redis_kind = "redis-server"
+            command = ["redis-server", "--port", str(port), "--save", ""]
+        else:
+            # A separate process, so it does not share a GIL with the client
+            self.redis_kind = "fakeredis"
+            command = [
+                sys.executable,
+                "-c",
+                "import sys; from fakeredis import TcpFakeServer; "
+                "TcpFakeServer(('127.0.0.1', int(sys.argv[1]))).serve_forever()",
+                str(port),
+            ]
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append(process)
+        wait_for_port(port, process, 10)
+        return port
+
+    def start_app(self, env: dict, port: int) -> None:
+        log = open(os.path.join(self.workdir, "gunicorn.log"), "w")
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "tools/loadtest_gunicorn.py"],
+            cwd=ROOT,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        self.processes.append(process)
+        wait_for_port(port, process, 120)
+
+    def stop(self) -> None:
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def sample_movies(scale: int) -> list:
+    with open(os.path.join(ROOT, "data", "imdb.json")) as f:
+        movies = json.load(f)
+    items = []
+    for copy in range(scale):
+        suffix = f" ({copy + 1})" if copy else ""
+        for movie in movies:
+            items.append(
+                {
+                    "name": movie["name"].strip() + suffix,
+                    "director": movie["director"].strip(),
+                    "imdb_score": movie["imdb_score"],
+                    "_99popularity": movie["99popularity"],
+                    "genres": [genre.strip() for genre in movie["genre"]],
+                }
+            )
+    return items
+
+
+def seed(env: dict, scale: int, users: int):
+    """Create the tables, the catalog (if empty) and the test accounts.
+
+    Returns:
+        tuple: Movie ids and names, user emails
+    """
+    os.environ.update(env)
+    from passlib.hash import pbkdf2_sha256
+
+    import postgres
+    from app import create_app
+    from db import db
+    from models import AdminModel, GenreModel, MovieModel, UserModel
+    from models.director import find_or_create_director
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if db.session.scalar(db.select(MovieModel.id).limit(1)) is None:
+            items = sample_movies(scale)
+            if postgres.enabled():
+                postgres.copy_movies(items)
+            else:
+                genres, directors = {}, {}
+                for item in items:
+                    movie = MovieModel(
+                        **{key: value for key, value in item.items() if key != "genres"}
+                    )
+                    for name in item["genres"]:
+                        if name not in genres:
+                            genres[name] = GenreModel(name=name)
+                        movie.genres.append(genres[name])
+                    director = item["director"]
+                    if director not in directors:
+                        directors[director] = find_or_create_director(director)
+                    movie.director_ref = directors[director]
+                    db.session.add(movie)
+            db.session.commit()
+
+        password = pbkdf2_sha256.hash(PASSWORD)
+        emails = [f"user{i}@loadtest.local" for i in range(users)]
+        existing = {
+            email
+            for (email,) in db.session.query(UserModel.email).filter(
+                UserModel.email.in_(emails)
+            )
+        }
+        for email in emails:
+            if email not in existing:
+                db.session.add(UserModel(email=email, password=password))
+        if not AdminModel.query.filter_by(email=ADMIN_EMAIL).first():
+            db.session.add(
+                AdminModel(email=ADMIN_EMAIL, password=password, is_admin=True)
+            )
+        db.session.commit()
+
+        rows = db.session.execute(
+            db.select(MovieModel.id, MovieModel.name)
+            .where(MovieModel.deleted_at.is_(None))
+            .order_by(MovieModel._99popularity.desc())
+        ).all()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    return [row.id for row in rows], [row.name for row in rows], emails
+
+
+def log_in(client: Client, workload: Workload) -> None:
+    for email in workload.users:
+        status, data = client.request(
+            "POST", "/users/login", {"email": email, "password": PASSWORD}
+        )
+        if status != 200:
+            raise SystemExit(f"Login of {email} failed with {status}: {data[:200]}")
+        workload.user_tokens.append(json.loads(data)["access_token"])
+    status, data = client.request(
+        "POST", "/admin/login", {"email": ADMIN_EMAIL, "password": PASSWORD}
+    )
+    if status != 200:
+        raise SystemExit(f"Admin login failed with {status}: {data[:200]}")
+    workload.admin_token = json.loads(data)["access_token"]
+
+
+class LockSampler(threading.Thread):
+    """Database lock waits while a step runs."""
+
+    def __init__(self, db_url: str):
+        super().__init__(daemon=True)
+        self.db_url = db_url
+        self.stopped = threading.Event()
+        self.waiting_samples = []
+        self.probe = Histogram()
+
+    def run(self) -> None:
+        if self.db_url.startswith("sqlite"):
+            self._probe_sqlite(self.db_url.split("///", 1)[1])
+        elif self.db_url.startswith("postgresql"):
+            self._sample_postgres()
+
+    def _sample_postgres(self) -> None:
+        from sqlalchemy import create_engine, text
+
+        engine = create_engine(self.db_url)
+        query = text(
+            "SELECT count(*) FROM pg_stat_activity "
+            "WHERE wait_event_type = 'Lock' AND datname = current_database()"
+        )
+        with engine.connect() as connection:
+            while not self.stopped.wait(LOCK_SAMPLE_INTERVAL):
+                self.waiting_samples.append(connection.execute(query).scalar())
+                connection.rollback()
+        engine.dispose()
+
+    def _probe_sqlite(self, path: str) -> None:
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        while not self.stopped.wait(LOCK_SAMPLE_INTERVAL):
+            start = time.perf_counter()
+            connection.execute("BEGIN IMMEDIATE")
+            self.probe.record(time.perf_counter() - start)
+            connection.execute("ROLLBACK")
+        connection.close()
+
+    def stop(self) -> dict:
+        self.stopped.set()
+        self.join()
+        if self.waiting_samples:
+            return {
+                "lock_wait_seconds": round(
+                    sum(self.waiting_samples) * LOCK_SAMPLE_INTERVAL, 3
+                ),
+                "max_waiting": max(self.waiting_samples),
+            }
+        if self.probe.count:
+            return {"write_lock_probe": self.probe.summary()}
+        return {}
+
+
+def cache_counters(redis_client) -> tuple:
+    hits, misses = redis_client.mget(HITS_KEY, MISSES_KEY)
+    return int(hits or 0), int(misses or 0)
+
+
+def offer(rate, duration, workload, weights, client, pool, recorder) -> float:
+    """Start requests at `rate` per second for `duration` seconds.
+
+    Returns:
+        float: Latest start behind schedule, in seconds (the client is the
+            bottleneck when this grows)
+    """
+    names = list(weights)
+    cumulative = []
+    total = 0
+    for name in names:
+        total += weights[name]
+        cumulative.append(total)
+
+    def fire(op, scheduled):
+        method, path, body, headers = OPERATIONS[op](workload)
+        try:
+            status, _ = client.request(method, path, body, headers)
+        except Exception as e:
+            status = type(e).__name__
+        recorder.record(op, status, time.perf_counter() - scheduled)
+
+    lag = 0.0
+    start = time.perf_counter()
+    scheduled = start
+    futures = []
+    while True:
+        scheduled += random.expovariate(rate)
+        if scheduled >= start + duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            lag = max(lag, -delay)
+        op = random.choices(names, cum_weights=cumulative)[0]
+        futures.append(pool.submit(fire, op, scheduled))
+    for future in futures:
+        future.result()
+    return lag
+
+
+def run_step(rate, args, workload, weights, client, pool, redis_client) -> dict:
+    recorder = Recorder()
+    sampler = LockSampler(args.db_url)
+    sampler.start()
+    hits, misses = cache_counters(redis_client)
+    started = time.perf_counter()
+    lag = offer(rate, args.duration, workload, weights, client, pool, recorder)
+    elapsed = time.perf_counter() - started
+    db_stats = sampler.stop()
+    # Let the workers flush their counters
+    time.sleep(1)
+    hits_after, misses_after = cache_counters(redis_client)
+    hits, misses = hits_after - hits, misses_after - misses
+
+    overall = Histogram()
+    for histogram in recorder.latency.values():
+        overall.merge(histogram)
+    requests = overall.count
+    return {
+        "rate": rate,
+        "requests": requests,
+        "throughput": round(requests / elapsed, 1),
+        "error_rate": round(recorder.errors() / requests, 4) if requests else 0,
+        "latency": overall.summary(),
+        "ops": {
+            op: {
+                "latency": histogram.summary(),
+                "statuses": dict(recorder.statuses[op]),
+                "errors": recorder.errors(op),
+            }
+            for op, histogram in sorted(recorder.latency.items())
+        },
+        "cache": {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+        },
+        "db": db_stats,
+        "client_lag_ms": round(lag * 1000, 1),
+    }
+
+
+def saturated(step: dict, args) -> bool:
+    p99 = step["latency"].get("p99_ms", 0)
+    return step["error_rate"] > args.max_error_rate or p99 > args.slo_ms
+
+
+def print_step(step: dict) -> None:
+    db_stats = step["db"]
+    if "lock_wait_seconds" in db_stats:
+        lock = f"{db_stats['lock_wait_seconds']}s"
+    elif "write_lock_probe" in db_stats:
+        lock = f"{db_stats['write_lock_probe'].get('p99_ms', 0)}ms"
+    else:
+        lock = "-"
+    ratio = step["cache"]["hit_ratio"]
+    print(
+        f"{step['rate']:>8} {step['throughput']:>9} "
+        f"{step['latency'].get('p50_ms', 0):>9} {step['latency'].get('p99_ms', 0):>9} "
+        f"{step['error_rate'] * 100:>6.2f}% "
+        f"{'-' if ratio is None else f'{ratio * 100:.1f}%':>7} {lock:>10}"
+    )
+
+
+HEADER = (
+    f"{'rate':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7} "
+    f"{'cache':>7} {'lock wait':>10}"
+)
+
+
+def run(args) -> None:
+    weights = parse_mix(args.mix)
+    rates = [float(rate) for rate in args.rates.split(",")]
+    # Seeding imports the app, which reads its settings from the environment
+    app_env = dict(os.environ)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="loadtest-")
+    os.makedirs(workdir, exist_ok=True)
+    args.db_url = args.db_url or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+
+    stack = Stack(workdir)
+    try:
+        redis_port = stack.start_redis()
+        app_port = free_port()
+        env = {
+            "DB_URL": args.db_url,
+            "CACHE_TYPE": "RedisCache",
+            "REDIS_HOST": "127.0.0.1",
+            "REDIS_PORT": str(redis_port),
+            "REDIS_DB": "0",
+            "RATELIMIT_STORAGE": "redis",
+            # Every simulated client shares one address
+            "RATELIMIT_ENABLED": "0",
+            "JWT_SECRET_KEY": "loadtest-secret-key-of-at-least-32-bytes",
+        }
+        overrides = dict(override.partition("=")[::2] for override in args.env)
+        env.update(overrides)
+
+        ids, names, users = seed(dict(env, APP_MODE="full"), args.scale, args.users)
+        env.update(
+            BIND=f"127.0.0.1:{app_port}",
+            WEB_CONCURRENCY=str(args.workers),
+            OPENAPI_SPEC_FILE=os.path.join(workdir, "openapi.json"),
+        )
+        stack.start_app(dict(app_env, **env), app_port)
+
+        import redis
+
+        redis_client = redis.Redis(port=redis_port)
+        client = Client(app_port, args.timeout)
+        workload = Workload(ids, names, users, args.skew)
+        log_in(client, workload)
+
+        profile = {
+            "workers": args.workers,
+            "db": args.db_url.split(":", 1)[0],
+            "redis": stack.redis_kind,
+            "movies": len(ids),
+            "users": len(users),
+            "mix": weights,
+            "skew": args.skew,
+            "duration": args.duration,
+            "env": overrides,
+        }
+        print(f"Stack in {workdir}: {json.dumps(profile)}")
+
+        steps = []
+        with ThreadPoolExecutor(args.clients) as pool:
+            if args.warmup:
+                recorder = Recorder()
+                offer(rates[0], args.warmup, workload, weights, client, pool, recorder)
+            print(HEADER)
+            for rate in rates:
+                step = run_step(
+                    rate, args, workload, weights, client, pool, redis_client
+                )
+                steps.append(step)
+                print_step(step)
+                if saturated(step, args) and not args.keep_going:
+                    break
+    finally:
+        stack.stop()
+
+    passing = [step["rate"] for step in steps if not saturated(step, args)]
+    report = {
+        "name": args.name or os.path.splitext(os.path.basename(args.out or "run"))[0],
+        "created": datetime.utcnow().isoformat(),
+        "profile": profile,
+        "slo": {"p99_ms": args.slo_ms, "max_error_rate": args.max_error_rate},
+        "saturation_rate": max(passing) if passing else None,
+        "steps": steps,
+    }
+    print(f"Saturation point: {report['saturation_rate']} req/s")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.out}")
+
+
+def compare(args) -> None:
+    reports = []
+    for path in args.reports:
+        with open(path) as f:
+            reports.append(json.load(f))
+    for report in reports:
+        print(
+            f"{report['name']}: saturation {report['saturation_rate']} req/s, "
+            f"{json.dumps(report['profile'])}"
+        )
+    rates = sorted({step["rate"] for report in reports for step in report["steps"]})
+    print()
+    names = " ".join(f"{report['name'][:28]:>28}" for report in reports)
+    print(f"{'rate':>8} {names}")
+    for rate in rates:
+        cells = []
+        for report in reports:
+            step = next((s for s in report["steps"] if s["rate"] == rate), None)
+            if step is None:
+                cells.append(f"{'-':>28}")
+            else:
+                cell = (
+                    f"{step['throughput']}/s p99 {step['latency'].get('p99_ms', 0)}ms "
+                    f"{step['error_rate'] * 100:.1f}%"
+                )
+                cells.append(f"{cell:>28}")
+        print(f"{rate:>8} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Boot the stack and offer load")
+    run_parser.add_argument("--rates", default="25,50,100,200,400", help="req/s steps")
+    run_parser.add_argument("--duration", type=float, default=30, help="s per step")
+    run_parser.add_argument("--warmup", type=float, default=5, help="Unrecorded s")
+    run_parser.add_argument("--workers", type=int, default=4, help="Gunicorn workers")
+    run_parser.add_argument("--db-url", help="Defaults to a fresh SQLite file")
+    run_parser.add_argument("--mix", default=DEFAULT_MIX, help="op=weight,...")
+    run_parser.add_argument("--scale", type=int, default=4, help="Sample data copies")
+    run_parser.add_argument("--users", type=int, default=20)
+    run_parser.add_argument("--skew", type=float, default=3, help="1 for uniform picks")
+    run_parser.add_argument("--clients", type=int, default=256, help="Client threads")
+    run_parser.add_argument("--timeout", type=float, default=10)
+    run_parser.add_argument("--slo-ms", type=float, default=500, help="p99 target")
+    run_parser.add_argument("--max-error-rate", type=float, default=0.01)
+    run_parser.add_argument(
+        "--keep-going", action="store_true", help="Run every rate, even past saturation"
+    )
+    run_parser.add_argument(
+        "--env", action="append", default=[], help="KEY=VALUE for the app; repeatable"
+    )
+    run_parser.add_argument("--workdir", help="Logs and database; default: temp dir")
+    run_parser.add_argument("--name", help="Report name; default: --out file name")
+    run_parser.add_argument("--out", help="JSON report path")
+
+    compare_parser = commands.add_parser("compare", help="Line up JSON reports")
+    compare_parser.add_argument("reports", nargs="+")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()
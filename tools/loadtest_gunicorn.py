@@ -0,0 +1,83 @@
+"""Gunicorn settings for load tests: gunicorn.conf.py plus cache hit counters.
+
+Fakeredis has no INFO command, so each worker counts the hits and misses of
+the app cache itself and adds them to Redis keys every FLUSH_INTERVAL
+seconds, where tools/loadtest.py reads them.
+
+    gunicorn -c tools/loadtest_gunicorn.py
+"""
+import os
+import runpy
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import HITS_KEY, MISSES_KEY, ROOT  # noqa: E402
+
+FLUSH_INTERVAL = 0.5
+
+globals().update(
+    {
+        key: value
+        for key, value in runpy.run_path(os.path.join(ROOT, "gunicorn.conf.py")).items()
+        if not key.startswith("__")
+    }
+)
+_app_post_fork = post_fork  # noqa: F821 (defined by gunicorn.conf.py)
+
+
+class CacheCounters:
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self._hits = self._misses = 0
+        threading.Thread(target=self._flush_forever, daemon=True).start()
+
+    def count(self, values) -> None:
+        hits = sum(value is not None for value in values)
+        with self._lock:
+            self._hits += hits
+            self._misses += len(values) - hits
+
+    def _flush_forever(self) -> None:
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            with self._lock:
+                hits, misses = self._hits, self._misses
+                self._hits = self._misses = 0
+            if not hits and not misses:
+                continue
+            try:
+                pipe = self._client.pipeline(transaction=False)
+                pipe.incrby(HITS_KEY, hits).incrby(MISSES_KEY, misses).execute()
+            except Exception as e:
+                print("Error: could not flush cache counters ", e)
+
+
+def _count_cache_reads():
+    from cache import cache
+
+    backend = cache.cache
+    counters = CacheCounters(backend._write_client)
+    get, get_many = backend.get, backend.get_many
+
+    def counted_get(key):
+        value = get(key)
+        counters.count([value])
+        return value
+
+    def counted_get_many(*keys):
+        values = get_many(*keys)
+        counters.count(values)
+        return values
+
+    backend.get, backend.get_many = counted_get, counted_get_many
+
+
+def post_fork(server, worker):
+    _app_post_fork(server, worker)
+    # The app was loaded in the master: its cache backend is already set up
+    with server.app.wsgi().app_context():
+        _count_cache_reads()
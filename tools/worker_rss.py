@@ -0,0 +1,58 @@
+"""Report the memory of each gunicorn worker (Linux only).
+
+    python tools/worker_rss.py <master pid>
+
+Private memory is what a worker costs on top of the memory it shares with
+the master; it should not grow with the number of workers.
+"""
+import argparse
+import os
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def children(pid: int) -> list:
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid follows it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+    return sorted(found)
+
+
+def memory(pid: int) -> dict:
+    """Memory counters of a process in KiB, from /proc/<pid>/smaps_rollup."""
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in FIELDS:
+                usage[key] = int(value.split()[0])
+    return usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pid", type=int, help="pid of the gunicorn master")
+    args = parser.parse_args()
+
+    print(f"{'pid':>8} {'rss':>10} {'pss':>10} {'shared':>10} {'private':>10}  (MiB)")
+    for pid in [args.pid] + children(args.pid):
+        usage = memory(pid)
+        shared = usage["Shared_Clean"] + usage["Shared_Dirty"]
+        private = usage["Private_Clean"] + usage["Private_Dirty"]
+        print(
+            f"{pid:>8} {usage['Rss'] / 1024:>10.1f} {usage['Pss'] / 1024:>10.1f} "
+            f"{shared / 1024:>10.1f} {private / 1024:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
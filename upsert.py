@@ -0,0 +1,188 @@
+"""Create-or-replace of movies keyed on their natural key (name, director).
+
+On SQLite and PostgreSQL the movie row is written with a single native
+INSERT ... ON CONFLICT (name, director) DO UPDATE, so a retried request
+updates the row it created instead of adding another one. Other databases
+look the movie up first and rely on the unique index to reject races. Deleted
+movies do not hold the natural key: putting one again creates a new movie.
+
+Core statements bypass the ORM flush hooks: the change is reported with
+`events.record_change` so caches, the change feed and the outbox see it.
+"""
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import db, movie_genre_association
+from events import INSERT, UPDATE, MovieChange, record_change
+from models import GenreModel, MovieModel
+from models.director import find_or_create_director
+
+
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _genres(names) -> list:
+    genres = []
+    for name in dict.fromkeys(name.strip() for name in names):
+        genre = GenreModel.query.filter_by(name=name).first()
+        if genre is None:
+            genre = GenreModel(name=name)
+            db.session.add(genre)
+        genres.append(genre)
+    return genres
+
+
+def _current(name: str, director: str):
+    """Snapshot (see events.snapshot) of the stored movie, or None."""
+    rows = db.session.execute(
+        db.select(
+            MovieModel.id,
+            MovieModel.imdb_score,
+            MovieModel._99popularity,
+            GenreModel.name,
+        )
+        .outerjoin(
+            movie_genre_association,
+            movie_genre_association.c.movie_id == MovieModel.id,
+        )
+        .outerjoin(GenreModel, GenreModel.id == movie_genre_association.c.genre_id)
+        .where(
+            MovieModel.name == name,
+            MovieModel.director == director,
+            MovieModel.deleted_at.is_(None),
+        )
+    ).all()
+    if not rows:
+        return None
+    id, imdb_score, popularity, _ = rows[0]
+    return {
+        "id": id,
+        "name": name,
+        "director": director,
+        "imdb_score": imdb_score,
+        "_99popularity": popularity,
+        "genres": sorted(row[3] for row in rows if row[3] is not None),
+    }
+
+
+def _upsert_row(values: dict, touch: bool) -> tuple:
+    """Insert or update the movie row.
+
+    An existing row is only updated, which bumps its version, when one of its
+    values differs or `touch` is set (its genres change).
+
+    Returns:
+        tuple: Movie id, whether it was inserted and whether it was written
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in UPSERT_INSERTS:
+        movie = (
+            MovieModel.live()
+            .filter_by(name=values["name"], director=values["director"])
+            .first()
+        )
+        created = movie is None
+        if created:
+            movie = MovieModel(**values)
+            db.session.add(movie)
+        else:
+            # A retry with the same values updates nothing: the version stays
+            for key in ("director_id", "imdb_score", "_99popularity"):
+                setattr(movie, key, values[key])
+            if touch:
+                movie.updated = values["updated"]
+        written = created or db.session.is_modified(movie)
+        db.session.flush()
+        return movie.id, created, written
+
+    insert = UPSERT_INSERTS[dialect](MovieModel).values(**values)
+    changed = db.or_(
+        MovieModel.director_id.is_distinct_from(insert.excluded.director_id),
+        MovieModel.imdb_score != insert.excluded.imdb_score,
+        MovieModel._99popularity != insert.excluded._99popularity,
+    )
+    statement = insert.on_conflict_do_update(
+        index_elements=[MovieModel.name, MovieModel.director],
+        # The natural key is a partial index over live movies
+        index_where=MovieModel.deleted_at.is_(None),
+        set_={
+            "director_id": insert.excluded.director_id,
+            "imdb_score": insert.excluded.imdb_score,
+            "_99popularity": insert.excluded._99popularity,
+            "updated": insert.excluded.updated,
+            "version": MovieModel.version + 1,
+        },
+        # A retry with the same values updates nothing: the version stays
+        where=None if touch else changed,
+    ).returning(MovieModel.id, MovieModel.version)
+    row = db.session.execute(statement).one_or_none()
+    if row is None:
+        id = db.session.execute(
+            db.select(MovieModel.id).where(
+                MovieModel.name == values["name"],
+                MovieModel.director == values["director"],
+                MovieModel.deleted_at.is_(None),
+            )
+        ).scalar_one()
+        return id, False, False
+    # Inserted rows have version 1, a conflict update bumps it
+    return row.id, row.version == 1, True
+
+
+def upsert_movie(name: str, data: dict):
+    """Create the movie `name` by data["director"], or replace its fields.
+
+    Args:
+        name (str): Title of the movie
+        data (dict): director, imdb_score, _99popularity and genres (names)
+
+    Returns:
+        tuple: Movie id, genres (GenreModel list) and whether it was created
+    """
+    director = data["director"]
+    genres = _genres(data["genres"])
+    director_ref = find_or_create_director(director)
+    # Assign ids to new genres and directors
+    db.session.flush()
+    before = _current(name, director)
+
+    names = sorted(genre.name for genre in genres)
+    id, created, written = _upsert_row(
+        {
+            "name": name,
+            "director": director,
+            "director_id": director_ref.id,
+            "imdb_score": data["imdb_score"],
+            "_99popularity": data["_99popularity"],
+            "updated": datetime.utcnow(),
+            "version": 1,
+        },
+        touch=before is None or before["genres"] != names,
+    )
+    if not written:
+        return id, genres, created
+    db.session.execute(
+        db.delete(movie_genre_association).where(
+            movie_genre_association.c.movie_id == id
+        )
+    )
+    if genres:
+        db.session.execute(
+            movie_genre_association.insert(),
+            [{"movie_id": id, "genre_id": genre.id} for genre in genres],
+        )
+
+    after = {
+        "id": id,
+        "name": name,
+        "director": director,
+        "imdb_score": data["imdb_score"],
+        "_99popularity": data["_99popularity"],
+        "genres": names,
+    }
+    record_change(
+        db.session,
+        MovieChange(INSERT if created else UPDATE, id, before=before, after=after),
+    )
+    return id, genres, created